@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from disk_driver import DiskDriver, CONFIG
+
+class BlockCache:
+    """
+    Buffer cache between the FileSystem and the DiskDriver.
+
+    Exposes the same block interface as DiskDriver, so the FileSystem can
+    use either. Holds up to `capacity` blocks in LRU order. Writes only
+    update the cached copy and mark it dirty; dirty blocks reach the
+    driver when they are evicted, on flush() (sync), or on close() (unmount).
+    """
+
+    def __init__(self, disk: DiskDriver, capacity: int = CONFIG['CACHE_BLOCKS']):
+        if capacity < 1:
+            raise ValueError(f"Cache capacity must be at least 1 block (got {capacity}).")
+        self.disk = disk
+        self.capacity = capacity
+        self.BLOCK_SIZE = disk.BLOCK_SIZE
+        self.num_blocks = disk.num_blocks
+        self.blocks = OrderedDict()  # block_id -> bytes, least recently used first
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def read_block(self, block_id: int) -> bytes:
+        data = self.blocks.get(block_id)
+        if data is not None:
+            self.hits += 1
+            self.blocks.move_to_end(block_id)
+            return data
+
+        self.misses += 1
+        # Copy, since an mmap-backed driver hands out views into the image
+        data = bytes(self.disk.read_block(block_id))
+        self._insert(block_id, data)
+        return data
+
+    def write_block(self, block_id: int, data: bytes):
+        if len(data) > self.BLOCK_SIZE:
+            raise ValueError(f"Data size ({len(data)}) exceeds block size ({self.BLOCK_SIZE}).")
+        if block_id >= self.num_blocks or block_id < 0:
+            raise IndexError(f"Block ID {block_id} is out of bounds.")
+
+        # Pad data with null bytes to fit the block exactly
+        self._insert(block_id, bytes(data).ljust(self.BLOCK_SIZE, b'\x00'))
+        self.dirty.add(block_id)
+
+    def _insert(self, block_id: int, data: bytes):
+        self.blocks[block_id] = data
+        self.blocks.move_to_end(block_id)
+        while len(self.blocks) > self.capacity:
+            victim, victim_data = self.blocks.popitem(last=False)
+            self.evictions += 1
+            if victim in self.dirty:
+                self._write_back(victim, victim_data)
+
+    def _write_back(self, block_id: int, data: bytes):
+        self.disk.write_block(block_id, data)
+        self.dirty.discard(block_id)
+        self.writebacks += 1
+
+    def flush(self):
+        """Writes every dirty block back (in block order), then flushes the driver."""
+        for block_id in sorted(self.dirty):
+            self._write_back(block_id, self.blocks[block_id])
+        self.disk.flush()
+
+    def close(self):
+        """Writes back dirty blocks and closes the driver."""
+        self.flush()
+        self.blocks.clear()
+        self.disk.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'capacity': self.capacity,
+            'cached': len(self.blocks),
+            'dirty': len(self.dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'writebacks': self.writebacks,
+        }
@@ -1,5 +1,6 @@
 import os
 import json
+import mmap
 
 # --- Configuration Loader ---
 def load_config():
@@ -9,6 +10,7 @@ def load_config():
             config = json.load(f)
             # Calculate derived value: POINTERS_PER_BLOCK
             config['POINTERS_PER_BLOCK'] = config['BLOCK_SIZE'] // config['POINTER_SIZE']
+            config.setdefault('CACHE_BLOCKS', 16)
             return config
     except FileNotFoundError:
         print("Error: config.json not found. Using default settings.")
@@ -18,6 +20,7 @@ def load_config():
             "DEFRAG_THRESHOLD": 0.50,
             "POINTER_SIZE": 4,
             "MAX_BLOCK_MAP_POINTERS": 1,
+            "CACHE_BLOCKS": 16,
             "POINTERS_PER_BLOCK": 128 # 512 // 4
         }
 
@@ -26,14 +29,34 @@ CONFIG = load_config()
 class DiskDriver:
     """
     Simulates a physical hard drive using a flat binary file.
+
+    Two access modes:
+      * 'mmap' (default): keeps one file descriptor open and maps the whole
+        image. read_block returns a zero-copy memoryview into the mapping and
+        write_block copies straight into it; changes reach the file on
+        flush() or close().
+      * 'per_call': opens, seeks and closes the image on every block access
+        and returns bytes. Kept for comparison.
     """
     BLOCK_SIZE = CONFIG['BLOCK_SIZE']
+    MODES = ('mmap', 'per_call')
 
-    def __init__(self, disk_path: str):
+    def __init__(self, disk_path: str, mode: str = 'mmap'):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown driver mode '{mode}' (expected one of {self.MODES}).")
         self.disk_path = disk_path
         self.num_blocks = CONFIG['NUM_BLOCKS']
+        self.mode = mode
         self.init_disk()
 
+        self._file = None
+        self._map = None
+        self._view = None
+        if mode == 'mmap':
+            self._file = open(self.disk_path, "r+b")
+            self._map = mmap.mmap(self._file.fileno(), self.num_blocks * self.BLOCK_SIZE)
+            self._view = memoryview(self._map)
+
     def init_disk(self):
         """Creates the physical file full of zeros if it doesn't exist."""
         if os.path.exists(self.disk_path):
@@ -44,12 +67,21 @@ class DiskDriver:
         with open(self.disk_path, "wb") as f:
             f.write(b'\x00' * total_size)
 
-    def read_block(self, block_id: int) -> bytes:
+    def read_block(self, block_id: int):
+        """
+        Returns the block's contents: a read-only view into the mapping in
+        'mmap' mode (valid until close(); copy with bytes() to keep it),
+        or bytes in 'per_call' mode.
+        """
         if block_id >= self.num_blocks or block_id < 0:
             raise IndexError(f"Block ID {block_id} is out of bounds.")
-        
+
+        start = block_id * self.BLOCK_SIZE
+        if self._view is not None:
+            return self._view[start:start + self.BLOCK_SIZE].toreadonly()
+
         with open(self.disk_path, "rb") as f:
-            f.seek(block_id * self.BLOCK_SIZE)
+            f.seek(start)
             return f.read(self.BLOCK_SIZE)
 
     def write_block(self, block_id: int, data: bytes):
@@ -58,9 +90,31 @@ class DiskDriver:
         if block_id >= self.num_blocks or block_id < 0:
             raise IndexError(f"Block ID {block_id} is out of bounds.")
 
+        start = block_id * self.BLOCK_SIZE
+        if self._view is not None:
+            self._view[start:start + len(data)] = data
+            # Pad with null bytes to fit the block exactly
+            self._view[start + len(data):start + self.BLOCK_SIZE] = bytes(self.BLOCK_SIZE - len(data))
+            return
+
         # Pad data with null bytes to fit the block exactly
-        padded_data = data.ljust(self.BLOCK_SIZE, b'\x00')
+        padded_data = bytes(data).ljust(self.BLOCK_SIZE, b'\x00')
 
         with open(self.disk_path, "r+b") as f:
-            f.seek(block_id * self.BLOCK_SIZE)
-            f.write(padded_data)
\ No newline at end of file
+            f.seek(start)
+            f.write(padded_data)
+
+    def flush(self):
+        """Writes pending changes in the mapping back to the image file."""
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        """Flushes and releases the mapping and file descriptor."""
+        if self._map is None:
+            return
+        self.flush()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+        self._view = self._map = self._file = None
@@ -1,14 +1,36 @@
 import json
 import math
 import os
-from typing import List, Dict, Optional, Set
+import struct
+import zlib
+from typing import List, Dict, Optional, Set, Tuple
 from disk_driver import DiskDriver, CONFIG
 
 # --- Constants ---
-# Increased to 128 to accommodate JSON metadata overhead
+# Legacy layout: one JSON entry per 128-byte slot. Only read, to migrate
+# images created before binary directory entries.
 DIR_ENTRY_SIZE = 128
 MAX_DIR_ENTRIES = CONFIG['BLOCK_SIZE'] // DIR_ENTRY_SIZE
 
+# Binary directory entries, packed back to back in a directory block:
+# type, name length, reference count, size, data block count, then the
+# block references (a file's block maps, or a directory's block) and the
+# UTF-8 name. A zero type byte ends the list.
+DIRENT_HEADER = struct.Struct('<BBHII')
+DIRENT_FILE = 1
+DIRENT_DIR = 2
+
+# Directory block headers (see DIRECTORY STORAGE). An entries block holds
+# its kind and the next block in its bucket chain (0 = end); an index block
+# holds its kind, bucket count and entry count, then the bucket table IDs.
+DIR_BLOCK_HEADER = struct.Struct('<BxxxI')
+DIR_INDEX_HEADER = struct.Struct('<BxxxII')
+DIR_ENTRIES = 1
+DIR_INDEX = 2
+DIR_INITIAL_BUCKETS = 8
+DIR_BUCKET_LOAD = 8
+DIRENT_FORMAT = 'hashed'
+
 class FileSystem:
     METADATA_BLOCK_ID = 0
     ROOT_DIR_BLOCK_ID = 1
@@ -18,17 +40,30 @@ class FileSystem:
         self.superblock = self._load_superblock()
         
         if not self.superblock or 'root_dir_block_id' not in self.superblock:
-            self.superblock = {'root_dir_block_id': self.ROOT_DIR_BLOCK_ID}
+            # Bitmap blocks sit right after the root directory
+            bitmap_blocks = list(range(self.ROOT_DIR_BLOCK_ID + 1, self.ROOT_DIR_BLOCK_ID + 1 + self._bitmap_block_count()))
+            self.superblock = {'root_dir_block_id': self.ROOT_DIR_BLOCK_ID, 'bitmap_blocks': bitmap_blocks,
+                               'dirent_format': DIRENT_FORMAT}
             self.disk.write_block(self.ROOT_DIR_BLOCK_ID, b'') 
+            self.bitmap = bytearray(math.ceil(self.disk.num_blocks / 8))
+            self._mark_blocks([self.METADATA_BLOCK_ID, self.ROOT_DIR_BLOCK_ID] + bitmap_blocks, True)
             self._save_superblock()
+            self.disk.flush()
             print(f"[FS] Formatted disk. Root at Block {self.ROOT_DIR_BLOCK_ID}.")
+        elif 'bitmap_blocks' not in self.superblock:
+            self._migrate_to_bitmap()
+        else:
+            self._load_bitmap()
+
+        if self.superblock.get('dirent_format') != DIRENT_FORMAT:
+            self._migrate_dirents()
         
         self.fragmentation_check()
 
     # --- LOW LEVEL HELPERS ---
     def _load_superblock(self) -> Dict:
         raw_data = self.disk.read_block(self.METADATA_BLOCK_ID)
-        clean_data = raw_data.rstrip(b'\x00')
+        clean_data = bytes(raw_data).rstrip(b'\x00')
         if not clean_data: return {}
         try:
             return json.loads(clean_data)
@@ -39,13 +74,45 @@ class FileSystem:
         data = json.dumps(self.superblock).encode('utf-8')
         self.disk.write_block(self.METADATA_BLOCK_ID, data)
 
-    def _read_dir_block(self, block_id: int) -> List[Dict]:
+    # --- DIRECTORY STORAGE ---
+    # Every directory block starts with DIR_BLOCK_HEADER. A directory that
+    # fits in one block is a single entries block. When it outgrows it, its
+    # block becomes an index (DIR_INDEX_HEADER plus bucket table block IDs)
+    # and entries move to buckets chosen by crc32 of the name. Each bucket is
+    # a chain of entries blocks, and the bucket count doubles once the
+    # directory averages DIR_BUCKET_LOAD entries per bucket, so a lookup
+    # reads the index, one table block and (usually) one entries block.
+    def _parse_dirents(self, view, offset: int) -> Tuple[List[Dict], int]:
+        entries = []
+        last = len(view) - DIRENT_HEADER.size
+        while offset <= last:
+            kind, name_len, ref_count, size, num_blocks = DIRENT_HEADER.unpack_from(view, offset)
+            if kind == 0:
+                break
+            offset += DIRENT_HEADER.size
+            refs = list(struct.unpack_from(f'<{ref_count}I', view, offset))
+            offset += 4 * ref_count
+            name = str(view[offset:offset + name_len], 'utf-8')
+            offset += name_len
+            if kind == DIRENT_DIR:
+                entries.append({'type': 'dir', 'name': name, 'dir_block_id': refs[0], 'size': size})
+            else:
+                entries.append({'type': 'file', 'name': name, 'size': size,
+                                'block_maps': refs, 'num_blocks': num_blocks})
+        return entries, offset
+
+    def _read_legacy_dir_block(self, block_id: int) -> List[Dict]:
         data = self.disk.read_block(block_id)
+        if self.superblock.get('dirent_format') == 'binary':
+            return self._parse_dirents(memoryview(data), 0)[0]
+        return self._read_json_dir_block(data)
+
+    def _read_json_dir_block(self, data) -> List[Dict]:
         entries = []
         for i in range(MAX_DIR_ENTRIES):
             start = i * DIR_ENTRY_SIZE
             end = start + DIR_ENTRY_SIZE
-            entry_bytes = data[start:end].rstrip(b'\x00')
+            entry_bytes = bytes(data[start:end]).rstrip(b'\x00')
             if entry_bytes:
                 try:
                     entries.append(json.loads(entry_bytes.decode('utf-8')))
@@ -53,45 +120,315 @@ class FileSystem:
                     continue
         return entries
 
-    def _write_dir_block(self, block_id: int, entries: List[Dict]):
-        block_content = b''
-        for entry in entries:
-            entry_data = json.dumps(entry).encode('utf-8')
-            if len(entry_data) > DIR_ENTRY_SIZE:
-                # Critical check: ensure metadata fits in the slot
-                raise ValueError(f"Entry '{entry.get('name')}' metadata too large ({len(entry_data)} > {DIR_ENTRY_SIZE}).")
-            block_content += entry_data.ljust(DIR_ENTRY_SIZE, b'\x00')
+    def _pack_dirent(self, entry: Dict) -> bytes:
+        name = entry['name'].encode('utf-8')
+        if len(name) > 255:
+            raise ValueError(f"Entry name '{entry['name']}' too long ({len(name)} > 255 bytes).")
+        if entry['type'] == 'dir':
+            kind, refs, num_blocks = DIRENT_DIR, [entry['dir_block_id']], 0
+        else:
+            kind, refs, num_blocks = DIRENT_FILE, entry.get('block_maps', []), entry['num_blocks']
+        return (DIRENT_HEADER.pack(kind, len(name), len(refs), entry.get('size', 0), num_blocks)
+                + struct.pack(f'<{len(refs)}I', *refs) + name)
+
+    def _read_entries_block(self, block_id: int) -> Tuple[List[Dict], int, int]:
+        """Returns the entries of one entries block, the next block in its chain (0 = end) and the bytes used."""
+        view = memoryview(self.disk.read_block(block_id))
+        _, next_block = DIR_BLOCK_HEADER.unpack_from(view, 0)
+        entries, used = self._parse_dirents(view, DIR_BLOCK_HEADER.size)
+        return entries, next_block, used
+
+    def _write_entries_block(self, block_id: int, entries: List[Dict], next_block: int = 0):
+        block_content = DIR_BLOCK_HEADER.pack(DIR_ENTRIES, next_block) + b''.join(self._pack_dirent(entry) for entry in entries)
+        if len(block_content) > self.disk.BLOCK_SIZE:
+            raise MemoryError(f"Directory block {block_id} is full ({len(entries)} entries need {len(block_content)} bytes).")
         
-        self.disk.write_block(block_id, block_content.ljust(self.disk.BLOCK_SIZE, b'\x00'))
+        self.disk.write_block(block_id, block_content)
 
-    def _add_or_update_entry(self, parent_block_id: int, entry: Dict, is_new: bool):
-        entries = self._read_dir_block(parent_block_id)
-        
-        if is_new and any(e['name'] == entry['name'] for e in entries):
-            raise ValueError(f"Entry '{entry['name']}' already exists.")
+    def _walk_chain(self, block_id: int):
+        while block_id:
+            entries, next_block, used = self._read_entries_block(block_id)
+            yield block_id, entries, next_block, used
+            block_id = next_block
+
+    def _read_dir_index(self, dir_block: int) -> Optional[Tuple[int, int, List[int]]]:
+        """Returns (bucket count, entry count, table block IDs) of a hashed directory, or None."""
+        if self.superblock.get('dirent_format') != DIRENT_FORMAT:
+            return None
+        view = memoryview(self.disk.read_block(dir_block))
+        kind, buckets, count = DIR_INDEX_HEADER.unpack_from(view, 0)
+        if kind != DIR_INDEX:
+            return None
+        tables = math.ceil(buckets / CONFIG['POINTERS_PER_BLOCK'])
+        return buckets, count, list(struct.unpack_from(f'<{tables}I', view, DIR_INDEX_HEADER.size))
+
+    def _write_dir_index(self, dir_block: int, buckets: int, count: int, tables: List[int]):
+        self.disk.write_block(dir_block, DIR_INDEX_HEADER.pack(DIR_INDEX, buckets, count)
+                              + struct.pack(f'<{len(tables)}I', *tables))
+
+    def _max_buckets(self) -> int:
+        tables = (self.disk.BLOCK_SIZE - DIR_INDEX_HEADER.size) // 4
+        return 1 << ((tables * CONFIG['POINTERS_PER_BLOCK']).bit_length() - 1)
+
+    def _bucket_of(self, name: str, buckets: int) -> int:
+        return zlib.crc32(name.encode('utf-8')) & (buckets - 1)
+
+    def _get_bucket(self, tables: List[int], bucket: int) -> int:
+        table, slot = divmod(bucket, CONFIG['POINTERS_PER_BLOCK'])
+        return struct.unpack_from('<I', self.disk.read_block(tables[table]), slot * 4)[0]
+
+    def _set_bucket(self, tables: List[int], bucket: int, head: int):
+        table, slot = divmod(bucket, CONFIG['POINTERS_PER_BLOCK'])
+        data = bytearray(self.disk.read_block(tables[table]))
+        struct.pack_into('<I', data, slot * 4, head)
+        self.disk.write_block(tables[table], bytes(data))
+
+    def _bucket_heads(self, tables: List[int]) -> List[int]:
+        heads = []
+        for table in tables:
+            heads.extend(struct.unpack_from(f"<{CONFIG['POINTERS_PER_BLOCK']}I", self.disk.read_block(table)))
+        return heads
+
+    def _list_dir(self, dir_block: int) -> List[Dict]:
+        if self.superblock.get('dirent_format') != DIRENT_FORMAT:
+            return self._read_legacy_dir_block(dir_block)
+        index = self._read_dir_index(dir_block)
+        if index is None:
+            return self._read_entries_block(dir_block)[0]
 
-        if is_new and len(entries) >= MAX_DIR_ENTRIES:
-            raise MemoryError(f"Directory block {parent_block_id} is full (Max {MAX_DIR_ENTRIES} entries).")
+        entries = []
+        for head in self._bucket_heads(index[2]):
+            for _, chunk, _, _ in self._walk_chain(head):
+                entries.extend(chunk)
+        return entries
 
-        found = False
-        for i, e in enumerate(entries):
-            if e['name'] == entry['name']:
-                entries[i] = entry
-                found = True
-                break
-        
-        if not found and is_new:
-            entries.append(entry)
+    def _dir_blocks(self, dir_block: int) -> List[int]:
+        """All blocks owned by a directory: its own block, plus bucket tables and entries blocks if hashed."""
+        index = self._read_dir_index(dir_block)
+        if index is None:
+            return [dir_block]
+        blocks = [dir_block] + index[2]
+        for head in self._bucket_heads(index[2]):
+            blocks.extend(block_id for block_id, _, _, _ in self._walk_chain(head))
+        return blocks
+
+    def _is_empty_dir(self, dir_block: int) -> bool:
+        index = self._read_dir_index(dir_block)
+        if index is None:
+            return not self._list_dir(dir_block)
+        return index[1] == 0
+
+    def _lookup(self, dir_block: int, name: str) -> Optional[Dict]:
+        index = self._read_dir_index(dir_block)
+        if index is None:
+            return next((e for e in self._list_dir(dir_block) if e['name'] == name), None)
+
+        buckets, _, tables = index
+        for _, entries, _, _ in self._walk_chain(self._get_bucket(tables, self._bucket_of(name, buckets))):
+            found = next((e for e in entries if e['name'] == name), None)
+            if found:
+                return found
+        return None
+
+    def _build_hashed_dir(self, dir_block: int, entries: List[Dict], buckets: int, old_blocks: List[int]):
+        """Lays `entries` out as a hashed directory rooted at dir_block, reusing old_blocks before allocating."""
+        capacity = self.disk.BLOCK_SIZE - DIR_BLOCK_HEADER.size
+        groups = [[] for _ in range(buckets)]
+        for entry in entries:
+            groups[self._bucket_of(entry['name'], buckets)].append(entry)
+
+        chains = []
+        for bucket, group in enumerate(groups):
+            chunks, used = [], capacity
+            for entry in group:
+                size = len(self._pack_dirent(entry))
+                if used + size > capacity:
+                    chunks.append([])
+                    used = 0
+                chunks[-1].append(entry)
+                used += size
+            if chunks:
+                chains.append((bucket, chunks))
+
+        table_count = math.ceil(buckets / CONFIG['POINTERS_PER_BLOCK'])
+        needed = table_count + sum(len(chunks) for _, chunks in chains)
+        if needed > len(old_blocks):
+            blocks = old_blocks + self._allocate_blocks(needed - len(old_blocks))
+        else:
+            blocks = old_blocks[:needed]
+            self._free_blocks(old_blocks[needed:])
+
+        tables, free = blocks[:table_count], iter(blocks[table_count:])
+        heads = [0] * (table_count * CONFIG['POINTERS_PER_BLOCK'])
+        for bucket, chunks in chains:
+            ids = [next(free) for _ in chunks]
+            heads[bucket] = ids[0]
+            for block_id, next_block, chunk in zip(ids, ids[1:] + [0], chunks):
+                self._write_entries_block(block_id, chunk, next_block)
+        for i, table in enumerate(tables):
+            start = i * CONFIG['POINTERS_PER_BLOCK']
+            self.disk.write_block(table, struct.pack(f"<{CONFIG['POINTERS_PER_BLOCK']}I",
+                                                     *heads[start:start + CONFIG['POINTERS_PER_BLOCK']]))
+        self._write_dir_index(dir_block, buckets, len(entries), tables)
+
+    def _write_dir(self, dir_block: int, entries: List[Dict]):
+        """Writes a whole directory: as one entries block if it fits, otherwise hashed."""
+        try:
+            self._write_entries_block(dir_block, entries)
+        except MemoryError:
+            buckets = DIR_INITIAL_BUCKETS
+            while len(entries) > buckets * DIR_BUCKET_LOAD and buckets < self._max_buckets():
+                buckets *= 2
+            self._build_hashed_dir(dir_block, entries, buckets, [])
+
+    def _migrate_dirents(self):
+        """Rewrites every directory of an older image (JSON slots, or binary entries without block headers)."""
+        directories = []
+
+        def collect(dir_block):
+            entries = self._list_dir(dir_block)
+            directories.append((dir_block, entries))
+            for entry in entries:
+                if entry['type'] == 'dir':
+                    collect(entry['dir_block_id'])
+
+        collect(self.ROOT_DIR_BLOCK_ID)
+        self.superblock['dirent_format'] = DIRENT_FORMAT
+        for block_id, entries in directories:
+            self._write_dir(block_id, entries)
+        self._save_superblock()
+        self.disk.flush()
+        print(f"[FS] Converted {len(directories)} director{'y' if len(directories) == 1 else 'ies'} to the current entry format.")
+
+    def _add_or_update_entry(self, parent_block_id: int, entry: Dict, is_new: bool):
+        index = self._read_dir_index(parent_block_id)
+        if index is None:
+            entries = self._list_dir(parent_block_id)
+            if is_new and any(e['name'] == entry['name'] for e in entries):
+                raise ValueError(f"Entry '{entry['name']}' already exists.")
+
+            found = False
+            for i, e in enumerate(entries):
+                if e['name'] == entry['name']:
+                    entries[i] = entry
+                    found = True
+                    break
             
-        self._write_dir_block(parent_block_id, entries)
+            if not found and is_new:
+                entries.append(entry)
+                
+            self._write_dir(parent_block_id, entries)
+            return
+
+        buckets, count, tables = index
+        bucket = self._bucket_of(entry['name'], buckets)
+        head = self._get_bucket(tables, bucket)
+        size = len(self._pack_dirent(entry))
+        room = None
+        for block_id, entries, next_block, used in self._walk_chain(head):
+            for i, e in enumerate(entries):
+                if e['name'] == entry['name']:
+                    if is_new:
+                        raise ValueError(f"Entry '{entry['name']}' already exists.")
+                    entries[i] = entry
+                    self._write_entries_block(block_id, entries, next_block)
+                    return
+            if room is None and used + size <= self.disk.BLOCK_SIZE:
+                room = (block_id, entries, next_block)
+        if not is_new:
+            return
+
+        if room:
+            block_id, entries, next_block = room
+            self._write_entries_block(block_id, entries + [entry], next_block)
+        else:
+            # Chain a new block in front of the bucket's existing ones
+            block_id = self._allocate_blocks(1)[0]
+            self._write_entries_block(block_id, [entry], head)
+            self._set_bucket(tables, bucket, block_id)
+
+        count += 1
+        if count > buckets * DIR_BUCKET_LOAD and buckets < self._max_buckets():
+            try:
+                self._build_hashed_dir(parent_block_id, self._list_dir(parent_block_id), buckets * 2,
+                                       self._dir_blocks(parent_block_id)[1:])
+                return
+            except MemoryError:
+                pass  # No room to grow; keep the longer chains
+        self._write_dir_index(parent_block_id, buckets, count, tables)
+
+    def _remove_entry(self, dir_block: int, name: str):
+        index = self._read_dir_index(dir_block)
+        if index is None:
+            self._write_dir(dir_block, [e for e in self._list_dir(dir_block) if e['name'] != name])
+            return
+
+        buckets, count, tables = index
+        bucket = self._bucket_of(name, buckets)
+        prev = None
+        for block_id, entries, next_block, _ in self._walk_chain(self._get_bucket(tables, bucket)):
+            kept = [e for e in entries if e['name'] != name]
+            if len(kept) == len(entries):
+                prev = (block_id, entries)
+                continue
+            if kept:
+                self._write_entries_block(block_id, kept, next_block)
+            else:
+                # Unlink and free the emptied block
+                if prev is None:
+                    self._set_bucket(tables, bucket, next_block)
+                else:
+                    self._write_entries_block(prev[0], prev[1], next_block)
+                self._free_blocks([block_id])
+            self._write_dir_index(dir_block, buckets, count - 1, tables)
+            return
 
     # --- ALLOCATION LOGIC ---
+    # Free space is tracked by a bitmap (bit i set = block i in use, LSB
+    # first) stored in the blocks listed in superblock['bitmap_blocks'] and
+    # held in memory while mounted. mkdir, import and rm update it.
+    def _bitmap_block_count(self) -> int:
+        return math.ceil(self.disk.num_blocks / (self.disk.BLOCK_SIZE * 8))
+
+    def _load_bitmap(self):
+        data = b''.join(bytes(self.disk.read_block(b)) for b in self.superblock['bitmap_blocks'])
+        self.bitmap = bytearray(data[:math.ceil(self.disk.num_blocks / 8)])
+
+    def _migrate_to_bitmap(self):
+        """Builds the bitmap for an image formatted before it existed, with one last tree walk."""
+        used = self._calculate_used_blocks()
+        count = self._bitmap_block_count()
+        bitmap_blocks = [i for i in range(2, self.disk.num_blocks) if i not in used][:count]
+        if len(bitmap_blocks) < count:
+            raise MemoryError("Disk Full! No room for the free-block bitmap.")
+        self.superblock['bitmap_blocks'] = bitmap_blocks
+        self.bitmap = bytearray(math.ceil(self.disk.num_blocks / 8))
+        self._mark_blocks(sorted(used) + bitmap_blocks, True)
+        self._save_superblock()
+        self.disk.flush()
+        print(f"[FS] Built free-block bitmap in Block(s) {bitmap_blocks}.")
+
+    def _mark_blocks(self, block_ids: List[int], used: bool):
+        # Updates the bits in memory, then rewrites only the bitmap blocks that changed
+        touched = set()
+        for block_id in block_ids:
+            mask = 1 << (block_id & 7)
+            if used:
+                self.bitmap[block_id >> 3] |= mask
+            else:
+                self.bitmap[block_id >> 3] &= ~mask & 0xFF
+            touched.add((block_id >> 3) // self.disk.BLOCK_SIZE)
+        for index in sorted(touched):
+            start = index * self.disk.BLOCK_SIZE
+            self.disk.write_block(self.superblock['bitmap_blocks'][index],
+                                  bytes(self.bitmap[start:start + self.disk.BLOCK_SIZE]))
+
     def _calculate_used_blocks(self) -> Set[int]:
         used = {self.METADATA_BLOCK_ID}
         
         def traverse(dir_block):
-            used.add(dir_block)
-            for entry in self._read_dir_block(dir_block):
+            used.update(self._dir_blocks(dir_block))
+            for entry in self._list_dir(dir_block):
                 if entry['type'] == 'dir':
                     traverse(entry['dir_block_id'])
                 elif entry['type'] == 'file':
@@ -102,14 +439,39 @@ class FileSystem:
         return used
 
     def _get_free_blocks(self, count: int) -> List[int]:
-        used = self._calculate_used_blocks()
-        free = []
-        for i in range(2, self.disk.num_blocks):
-            if i not in used:
-                free.append(i)
-                if len(free) == count:
-                    return free
-        raise MemoryError(f"Disk Full! Need {count}, found {len(free)}.")
+        # Bitmap scan that skips fully used bytes. The first run of `count`
+        # contiguous free blocks wins; otherwise the lowest free blocks.
+        if count == 0:
+            return []
+        first_free = []
+        run = []
+        for byte_index, byte in enumerate(self.bitmap):
+            if byte == 0xFF:
+                run = []
+                continue
+            for bit in range(8):
+                block_id = byte_index * 8 + bit
+                if block_id >= self.disk.num_blocks:
+                    break
+                if byte & (1 << bit):
+                    run = []
+                    continue
+                run.append(block_id)
+                if len(run) == count:
+                    return run
+                if len(first_free) < count:
+                    first_free.append(block_id)
+        if len(first_free) == count:
+            return first_free
+        raise MemoryError(f"Disk Full! Need {count}, found {len(first_free)}.")
+
+    def _allocate_blocks(self, count: int) -> List[int]:
+        blocks = self._get_free_blocks(count)
+        self._mark_blocks(blocks, True)
+        return blocks
+
+    def _free_blocks(self, block_ids: List[int]):
+        self._mark_blocks(block_ids, False)
 
     def _get_data_blocks(self, file_info: Dict) -> List[int]:
         data_blocks = []
@@ -129,7 +491,7 @@ class FileSystem:
         return data_blocks
 
     def fragmentation_check(self):
-        used = len(self._calculate_used_blocks())
+        used = bin(int.from_bytes(self.bitmap, 'little')).count('1')
         pct = used / self.disk.num_blocks
         if pct > CONFIG['DEFRAG_THRESHOLD']:
             print(f"[Warning] Disk Usage: {pct:.1%} (Threshold: {CONFIG['DEFRAG_THRESHOLD']:.1%})")
@@ -145,8 +507,7 @@ class FileSystem:
         curr_entry = None
         
         for i, part in enumerate(parts):
-            entries = self._read_dir_block(curr_block)
-            found = next((e for e in entries if e['name'] == part), None)
+            found = self._lookup(curr_block, part)
             
             if not found: return None
             
@@ -174,8 +535,9 @@ class FileSystem:
             print(f"Error: Parent '{parent_path}' not found.")
             return
 
+        block_id = None
         try:
-            block_id = self._get_free_blocks(1)[0]
+            block_id = self._allocate_blocks(1)[0]
             self.disk.write_block(block_id, b'') 
             
             new_entry = {
@@ -187,7 +549,10 @@ class FileSystem:
             self._add_or_update_entry(parent['dir_block_id'], new_entry, True)
             print(f"Directory '{path}' created.")
         except Exception as e:
+            if block_id is not None:
+                self._free_blocks([block_id])
             print(f"Mkdir failed: {e}")
+        self.disk.flush()
 
     def import_file(self, src_path: str, dest_path: str):
         if self._find_entry(dest_path):
@@ -207,8 +572,13 @@ class FileSystem:
              print("File too large for configuration.")
              return
 
+        parent = self._find_entry(os.path.dirname(dest_path), 'dir')
+        if not parent:
+            print("Error: Parent directory not found.")
+            return
+
         try:
-            needed = self._get_free_blocks(num_map_blocks + num_data_blocks)
+            needed = self._allocate_blocks(num_map_blocks + num_data_blocks)
             map_ids = needed[:num_map_blocks]
             data_ids = needed[num_map_blocks:]
         except MemoryError as e:
@@ -225,14 +595,10 @@ class FileSystem:
         map_bytes = b''
         for bid in data_ids:
             map_bytes += bid.to_bytes(CONFIG['POINTER_SIZE'], 'little')
-        self.disk.write_block(map_ids[0], map_bytes)
+        if map_ids:
+            self.disk.write_block(map_ids[0], map_bytes)
 
         # Update Dir
-        parent = self._find_entry(os.path.dirname(dest_path), 'dir')
-        if not parent:
-            print("Error: Parent directory not found.")
-            return
-
         entry = {
             'type': 'file',
             'name': os.path.basename(dest_path),
@@ -243,8 +609,10 @@ class FileSystem:
         try:
             self._add_or_update_entry(parent['dir_block_id'], entry, True)
             print(f"Imported '{os.path.basename(dest_path)}'.")
-        except ValueError as e:
+        except (ValueError, MemoryError) as e:
+            self._free_blocks(needed)
             print(f"Error: {e}")
+        self.disk.flush()
 
     def cat(self, path: str):
         entry = self._find_entry(path, 'file')
@@ -273,7 +641,7 @@ class FileSystem:
         print(f"{'TYPE':<6} {'NAME':<15} {'SIZE':<8} {'BLOCKS'}")
         print("-" * 40)
         
-        entries = self._read_dir_block(entry['dir_block_id'])
+        entries = self._list_dir(entry['dir_block_id'])
         if not entries:
             print("(Empty)")
             return
@@ -296,8 +664,7 @@ class FileSystem:
             return
 
         if entry['type'] == 'dir':
-            children = self._read_dir_block(entry['dir_block_id'])
-            if children:
+            if not self._is_empty_dir(entry['dir_block_id']):
                 print(f"Error: Directory '{path}' is not empty.")
                 return
         
@@ -307,9 +674,12 @@ class FileSystem:
             print("Error: Cannot delete root.")
             return
 
-        # Rewrite parent directory block excluding this entry
-        current_entries = self._read_dir_block(parent_block_id)
-        new_entries = [e for e in current_entries if e['name'] != entry['name']]
-        self._write_dir_block(parent_block_id, new_entries)
+        self._remove_entry(parent_block_id, entry['name'])
+
+        if entry['type'] == 'dir':
+            self._free_blocks(self._dir_blocks(entry['dir_block_id']))
+        else:
+            self._free_blocks(entry.get('block_maps', []) + self._get_data_blocks(entry))
+        self.disk.flush()
         
         print(f"Deleted '{path}'.")
\ No newline at end of file
@@ -1,11 +1,17 @@
 import argparse
 import sys
-from disk_driver import DiskDriver
+from disk_driver import DiskDriver, CONFIG
+from block_cache import BlockCache
 from filesystem import FileSystem
 
 def main():
     parser = argparse.ArgumentParser(description="PyFS: Simulation Filesystem")
     parser.add_argument("disk", help="Path to disk file (e.g. segmented_test.dsk)")
+    parser.add_argument("--driver", choices=DiskDriver.MODES, default="mmap",
+                        help="Disk access mode: one mmap for the session, or open/seek/close per block")
+    parser.add_argument("--cache", type=int, default=CONFIG['CACHE_BLOCKS'],
+                        help="Block cache capacity in blocks (0 disables the cache)")
+    parser.add_argument("--stats", action="store_true", help="Print block cache statistics on exit")
     
     subparsers = parser.add_subparsers(dest="command", required=True)
     
@@ -34,23 +40,31 @@ def main():
 
     # Initialize
     try:
-        driver = DiskDriver(args.disk)
+        driver = DiskDriver(args.disk, args.driver)
+        if args.cache > 0:
+            driver = BlockCache(driver, args.cache)
         fs = FileSystem(driver)
     except Exception as e:
         print(f"CRITICAL ERROR: {e}")
         sys.exit(1)
 
     # Execute
-    if args.command == "ls":
-        fs.ls(args.path)
-    elif args.command == "mkdir":
-        fs.mkdir(args.path)
-    elif args.command == "import":
-        fs.import_file(args.src, args.dest)
-    elif args.command == "cat":
-        fs.cat(args.path)
-    elif args.command == "rm":
-        fs.rm(args.path)
+    try:
+        if args.command == "ls":
+            fs.ls(args.path)
+        elif args.command == "mkdir":
+            fs.mkdir(args.path)
+        elif args.command == "import":
+            fs.import_file(args.src, args.dest)
+        elif args.command == "cat":
+            fs.cat(args.path)
+        elif args.command == "rm":
+            fs.rm(args.path)
+    finally:
+        if args.stats and isinstance(driver, BlockCache):
+            print("[Cache] " + ", ".join(f"{k}={v:.1%}" if k == 'hit_rate' else f"{k}={v}"
+                                         for k, v in driver.stats().items()))
+        driver.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,188 @@
+import contextlib
+import io
+import json
+import os
+import struct
+import tempfile
+import unittest
+from disk_driver import DiskDriver, CONFIG
+from filesystem import FileSystem, DIRENT_HEADER, DIRENT_FILE, DIRENT_DIR, DIRENT_FORMAT, DIR_INITIAL_BUCKETS
+
+BLOCK_SIZE = CONFIG['BLOCK_SIZE']
+
+def legacy_json_dir(entries):
+    # One JSON entry per 128-byte slot, as written before binary entries
+    return b''.join(json.dumps(entry).encode().ljust(128, b'\x00') for entry in entries)
+
+def headerless_dir(entries):
+    # Binary entries without a directory block header, as written by the first binary layout
+    data = b''
+    for kind, name, refs, size, num_blocks in entries:
+        data += (DIRENT_HEADER.pack(kind, len(name), len(refs), size, num_blocks)
+                 + struct.pack(f'<{len(refs)}I', *refs) + name.encode())
+    return data
+
+def pointers(block_ids):
+    return b''.join(block_id.to_bytes(CONFIG['POINTER_SIZE'], 'little') for block_id in block_ids)
+
+class TestFileSystem(unittest.TestCase):
+    NUM_BLOCKS = 2048
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.image = os.path.join(self.tmp.name, 'test.dsk')
+        self.saved_blocks = CONFIG['NUM_BLOCKS']
+        CONFIG['NUM_BLOCKS'] = self.NUM_BLOCKS
+        self.mounted = []
+
+    def tearDown(self):
+        for fs in self.mounted:
+            fs.disk.close()
+        CONFIG['NUM_BLOCKS'] = self.saved_blocks
+        self.tmp.cleanup()
+
+    def run_quietly(self, command, *args):
+        # Returns what the command printed
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            command(*args)
+        return out.getvalue()
+
+    def mount(self):
+        for fs in self.mounted:
+            fs.disk.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fs = FileSystem(DiskDriver(self.image))
+        self.mounted.append(fs)
+        return fs
+
+    def write_image(self, blocks):
+        # Raw image with the given {block_id: bytes} contents
+        data = bytearray(self.NUM_BLOCKS * BLOCK_SIZE)
+        for block_id, content in blocks.items():
+            data[block_id * BLOCK_SIZE:block_id * BLOCK_SIZE + len(content)] = content
+        with open(self.image, 'wb') as f:
+            f.write(data)
+
+    def host_file(self, name, content=b''):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def names(self, fs, path):
+        return sorted(entry['name'] for entry in fs._list_dir(fs._find_entry(path, 'dir')['dir_block_id']))
+
+    def assert_bitmap_matches_tree(self, fs):
+        marked = {b for b in range(fs.disk.num_blocks) if fs.bitmap[b >> 3] >> (b & 7) & 1}
+        self.assertEqual(marked, fs._calculate_used_blocks() | set(fs.superblock['bitmap_blocks']))
+
+    def test_json_image_is_migrated(self):
+        # Pre-bitmap, pre-binary image: a.txt and docs/b.txt
+        self.write_image({
+            0: json.dumps({'root_dir_block_id': 1}).encode(),
+            1: legacy_json_dir([
+                {'type': 'file', 'name': 'a.txt', 'size': 5, 'block_maps': [3], 'num_blocks': 1},
+                {'type': 'dir', 'name': 'docs', 'dir_block_id': 5, 'size': 0},
+            ]),
+            3: pointers([4]),
+            4: b'hello',
+            5: legacy_json_dir([{'type': 'file', 'name': 'b.txt', 'size': 5, 'block_maps': [6], 'num_blocks': 1}]),
+            6: pointers([7]),
+            7: b'world',
+        })
+        fs = self.mount()
+        self.assertEqual(fs.superblock['dirent_format'], DIRENT_FORMAT)
+        self.assertEqual(fs.superblock['bitmap_blocks'], [2])
+        self.assertEqual(self.names(fs, '/'), ['a.txt', 'docs'])
+        self.assertEqual(self.run_quietly(fs.cat, '/docs/b.txt'), 'world\n')
+        self.assert_bitmap_matches_tree(fs)
+        # The conversion is stored: a remount reads the new format directly
+        fs = self.mount()
+        self.assertEqual(self.run_quietly(fs.cat, '/a.txt'), 'hello\n')
+        self.assert_bitmap_matches_tree(fs)
+
+    def test_headerless_binary_image_is_migrated(self):
+        # Root entries fill 508 bytes: they fit a headerless block but not
+        # one with DIR_BLOCK_HEADER, so the root comes back hashed
+        root = [(DIRENT_FILE, f'f{i:02d}', [], 0, 0) for i in range(25)]
+        root += [(DIRENT_FILE, 'a.txt', [3], 5, 1), (DIRENT_DIR, 'docs', [5], 0, 0),
+                 (DIRENT_FILE, 'x' * 80, [], 0, 0)]
+        self.assertEqual(len(headerless_dir(root)), 508)
+        bitmap = bytearray(BLOCK_SIZE)
+        bitmap[0] = 0xFF  # Blocks 0-7
+        self.write_image({
+            0: json.dumps({'root_dir_block_id': 1, 'bitmap_blocks': [2], 'dirent_format': 'binary'}).encode(),
+            1: headerless_dir(root),
+            2: bitmap,
+            3: pointers([4]),
+            4: b'hello',
+            5: headerless_dir([(DIRENT_FILE, 'b.txt', [6], 5, 1)]),
+            6: pointers([7]),
+            7: b'world',
+        })
+        fs = self.mount()
+        self.assertEqual(fs.superblock['dirent_format'], DIRENT_FORMAT)
+        self.assertIsNotNone(fs._read_dir_index(fs.ROOT_DIR_BLOCK_ID))
+        self.assertEqual(len(self.names(fs, '/')), 28)
+        self.assertEqual(self.run_quietly(fs.cat, '/a.txt'), 'hello\n')
+        self.assertEqual(self.run_quietly(fs.cat, '/docs/b.txt'), 'world\n')
+        self.assert_bitmap_matches_tree(fs)
+
+    def test_hashed_directory_grows_and_shrinks(self):
+        fs = self.mount()
+        empty = self.host_file('empty')
+        baseline = fs._calculate_used_blocks()
+        self.run_quietly(fs.mkdir, '/big')
+        big = fs._find_entry('/big')['dir_block_id']
+        count = 600
+        for i in range(count):
+            self.run_quietly(fs.import_file, empty, f'/big/file-{i:04d}')
+        buckets, entries, _ = fs._read_dir_index(big)
+        self.assertEqual(entries, count)
+        # Doubled from DIR_INITIAL_BUCKETS until the load is back under DIR_BUCKET_LOAD
+        self.assertEqual(buckets, DIR_INITIAL_BUCKETS * 16)
+        fs = self.mount()
+        self.assertEqual(len(self.names(fs, '/big')), count)
+        self.assertIsNotNone(fs._lookup(big, 'file-0123'))
+        self.assertIsNone(fs._lookup(big, 'file-9999'))
+        self.assert_bitmap_matches_tree(fs)
+
+        grown = len(fs._dir_blocks(big))
+        for i in range(0, count, 2):
+            self.run_quietly(fs.rm, f'/big/file-{i:04d}')
+        self.assertEqual(fs._read_dir_index(big)[1], count // 2)
+        self.assertLess(len(fs._dir_blocks(big)), grown)
+        self.assertIsNone(fs._lookup(big, 'file-0000'))
+        self.assertIsNotNone(fs._lookup(big, 'file-0001'))
+        self.assert_bitmap_matches_tree(fs)
+
+        self.assertIn('not empty', self.run_quietly(fs.rm, '/big'))
+        for i in range(1, count, 2):
+            self.run_quietly(fs.rm, f'/big/file-{i:04d}')
+        self.assertTrue(fs._is_empty_dir(big))
+        self.run_quietly(fs.rm, '/big')
+        self.assertEqual(fs._calculate_used_blocks(), baseline)
+        self.assert_bitmap_matches_tree(fs)
+
+    def test_bitmap_tracks_mkdir_import_rm(self):
+        fs = self.mount()
+        data = self.host_file('data', b'x' * (BLOCK_SIZE * 3 + 10))
+        self.run_quietly(fs.mkdir, '/docs')
+        self.run_quietly(fs.mkdir, '/docs/inner')
+        self.run_quietly(fs.import_file, data, '/docs/a.bin')
+        self.run_quietly(fs.import_file, data, '/docs/inner/b.bin')
+        self.assert_bitmap_matches_tree(fs)
+        # A failed import (duplicate name) must not leak its blocks
+        self.run_quietly(fs.import_file, data, '/docs/a.bin')
+        self.assert_bitmap_matches_tree(fs)
+        self.run_quietly(fs.rm, '/docs/a.bin')
+        self.run_quietly(fs.rm, '/docs/inner/b.bin')
+        self.run_quietly(fs.rm, '/docs/inner')
+        self.assert_bitmap_matches_tree(fs)
+        fs = self.mount()
+        self.assertEqual(self.names(fs, '/docs'), [])
+        self.assert_bitmap_matches_tree(fs)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from .order_book import OrderBook, SymbolSpec
+from .feed import MarketDataFeed
+from .tape import TradeTape
+from .pnl import PnLTracker
+from .risk import RiskEngine, MaxOrderSize, PriceBand, PositionLimit, MessageRate
+from . import journal as journal_store
+
+# Tick and lot sizes per symbol; symbols not listed use DEFAULT_SPEC
+SYMBOL_SPECS = {
+    'BTCUSD': SymbolSpec(tick_size=0.01, lot_size=0.0001),
+    'ETHUSD': SymbolSpec(tick_size=0.01, lot_size=0.001),
+}
+DEFAULT_SPEC = SymbolSpec(tick_size=0.01, lot_size=0.01)
+
+logger = logging.getLogger(__name__)
+
+def _new_book(symbol: str) -> OrderBook:
+    book = OrderBook(symbol, SYMBOL_SPECS.get(symbol, DEFAULT_SPEC), pnl_tracker)
+    book.journal = journal
+    market_feeds[symbol] = MarketDataFeed(book)
+    trade_tapes[symbol] = TradeTape(book)
+    return book
+
+market_feeds = {}
+trade_tapes = {}
+journal = None
+# One portfolio store fed by every book
+pnl_tracker = PnLTracker()
+# Pre-trade checks applied to every new order entering over the API
+risk_engine = RiskEngine([
+    MessageRate(max_messages=1000, per_seconds=1.0),
+    MaxOrderSize(max_quantity=1000000),
+    PriceBand(fraction=0.2),
+    PositionLimit(max_position=10000000),
+])
+# Symbol -> OrderBook shared by every request thread. Each book carries its
+# own lock, so different symbols match in parallel; this lock only guards
+# creating new books.
+order_books = {'BTCUSD': _new_book('BTCUSD')}
+_books_lock = threading.Lock()
+# Serialises checkpoints: one that finished late would put an older
+# snapshot back over the generations a newer one already deleted
+_checkpoint_lock = threading.Lock()
+
+def get_book(symbol: str, create: bool = False):
+    """
+    Returns the OrderBook for symbol, or None if it does not exist and
+    create is False. Concurrent creates of the same symbol get one book.
+    """
+    book = order_books.get(symbol)
+    if book is None and create:
+        with _books_lock:
+            book = order_books.get(symbol)
+            if book is None:
+                book = order_books[symbol] = _new_book(symbol)
+    return book
+
+def get_feed(symbol: str):
+    book = get_book(symbol)
+    if book is None:
+        return None
+    return market_feeds[symbol]
+
+def get_tape(symbol: str):
+    book = get_book(symbol)
+    if book is None:
+        return None
+    return trade_tapes[symbol]
+
+def enable_journal(directory: str, snapshot_interval: float = 60.0):
+    """
+    Replaces the in-memory books with those recovered from directory and
+    journals every later command there. A daemon thread checkpoints every
+    snapshot_interval seconds so the journal tail stays short.
+    """
+    global journal
+    with _books_lock:
+        books, journal = journal_store.recover(directory, _new_book)
+        # Replayed trades were stamped with the replay time, not when they happened
+        for symbol in books:
+            trade_tapes[symbol].clear()
+        order_books.clear()
+        order_books.update(books)
+
+    def run_checkpoints():
+        # A failed checkpoint leaves the journal growing, but must not end
+        # the loop: the next one starts over from the books
+        while True:
+            time.sleep(snapshot_interval)
+            try:
+                checkpoint()
+            except Exception:
+                logger.exception('checkpoint failed')
+    if snapshot_interval:
+        threading.Thread(target=run_checkpoints, daemon=True).start()
+
+def checkpoint():
+    # Freezes creation and every book (in symbol order) only while their
+    # state is copied; the snapshot is encoded and written afterwards
+    if journal is None:
+        return
+    with _checkpoint_lock:
+        with _books_lock:
+            books = [order_books[symbol] for symbol in sorted(order_books)]
+            for book in books:
+                book.lock.acquire()
+            try:
+                pending = journal.begin_checkpoint({book.symbol: book for book in books})
+            finally:
+                for book in books:
+                    book.lock.release()
+        journal.finish_checkpoint(pending)
+
+def mid_marks(symbols):
+    # Book mids for the given symbols, skipping books without a two-sided market
+    marks = {}
+    for symbol in symbols:
+        book = get_book(symbol)
+        if book is None:
+            continue
+        with book.lock:
+            mid = book.mid_price()
+        if mid is not None:
+            marks[symbol] = mid
+    return marks
@@ -0,0 +1,125 @@
+import json
+import queue
+from collections import deque
+from itertools import islice
+from typing import Optional
+from .order_book import OrderBook
+
+class Subscription:
+    """
+    A consumer's view of a MarketDataFeed. Messages arrive through a bounded
+    queue; if the consumer falls behind and the queue overflows, the next
+    read resynchronises from the feed instead of silently skipping updates.
+    """
+    def __init__(self, feed: 'MarketDataFeed', last_seq: int, max_pending: int):
+        self.feed = feed
+        self.last_seq = last_seq
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Returns the next messages to deliver: normally one update, a replay
+        or snapshot after a gap, or an empty list if nothing arrived within
+        timeout.
+        """
+        if self.overflowed:
+            return self.feed.resync(self)
+        try:
+            message = self.pending.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        if message['seq'] != self.last_seq + 1:
+            return self.feed.resync(self)
+        self.last_seq = message['seq']
+        return [message]
+
+    def close(self):
+        self.feed.unsubscribe(self)
+
+class MarketDataFeed:
+    """
+    Sequenced stream of L2 level updates and trade prints for one OrderBook,
+    with prices and quantities converted from ticks and lots.
+    Registered as a book listener, so it publishes while the book lock is
+    held; sequence numbers therefore follow the book's own ordering. The
+    last `history` events are kept so reconnecting or lagging consumers
+    can replay from their last sequence number, and anyone further behind
+    gets a depth snapshot to restart from. Events are kept as the book
+    published them and only turned into messages when someone reads them,
+    so a feed nobody subscribes to costs a sequence number and a deque
+    append per event.
+    """
+    def __init__(self, book: OrderBook, history: int = 10000, max_pending: int = 1000):
+        self.book = book
+        self.symbol = book.symbol
+        self.seq = 0
+        self.history = deque(maxlen=history)
+        self.max_pending = max_pending
+        self.subscribers = []
+        book.listeners.append(self.on_event)
+
+    def on_event(self, event: str, data: dict):
+        self.seq += 1
+        self.history.append((self.seq, event, data))
+        if not self.subscribers:
+            return
+        message = self._message(self.seq, event, data)
+        for sub in self.subscribers:
+            if sub.overflowed:
+                continue
+            try:
+                sub.pending.put_nowait(message)
+            except queue.Full:
+                sub.overflowed = True
+
+    def _message(self, seq: int, event: str, data: dict) -> dict:
+        message = {'seq': seq, 'symbol': self.symbol, 'type': event}
+        message.update(data)
+        message['price'] = self.book.spec.to_price(data['price'])
+        message['quantity'] = self.book.spec.to_quantity(data['quantity'])
+        return message
+
+    def subscribe(self, last_seq: Optional[int] = None):
+        """
+        Returns (subscription, catch_up) where catch_up is the list of
+        messages to deliver first: a replay after last_seq when it is still
+        in history, otherwise a snapshot.
+        """
+        with self.book.lock:
+            sub = Subscription(self, self.seq, self.max_pending)
+            catch_up = self._catch_up(last_seq)
+            self.subscribers.append(sub)
+        return sub, catch_up
+
+    def unsubscribe(self, sub: Subscription):
+        with self.book.lock:
+            if sub in self.subscribers:
+                self.subscribers.remove(sub)
+
+    def resync(self, sub: Subscription):
+        with self.book.lock:
+            catch_up = self._catch_up(sub.last_seq)
+            sub.pending = queue.Queue(maxsize=self.max_pending)
+            sub.overflowed = False
+            sub.last_seq = self.seq
+        return catch_up
+
+    def _catch_up(self, last_seq: Optional[int]):
+        # Caller holds the book lock, so history and depth match self.seq
+        if last_seq == self.seq:
+            return []
+        if last_seq is not None and last_seq < self.seq and self.history[0][0] <= last_seq + 1:
+            return [self._message(*entry)
+                    for entry in islice(self.history, last_seq + 1 - self.history[0][0], None)]
+        return [self.snapshot()]
+
+    def snapshot(self):
+        depth = self.book.get_l2_depth()
+        spec = self.book.spec
+        return {'seq': self.seq, 'symbol': self.symbol, 'type': 'snapshot',
+                'bids': [(spec.to_price(p), spec.to_quantity(q)) for p, q in depth['bids']],
+                'asks': [(spec.to_price(p), spec.to_quantity(q)) for p, q in depth['asks']]}
+
+def format_sse(message: dict) -> str:
+    return f"id: {message['seq']}\nevent: {message['type']}\ndata: {json.dumps(message)}\n\n"
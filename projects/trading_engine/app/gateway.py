@@ -0,0 +1,209 @@
+"""
+Binary order-entry gateway.
+
+An asyncio TCP server that drives the same OrderBook objects as the Flask
+API (through app.books, under the same book locks and risk checks) without
+HTTP or JSON. Messages are fixed-width little-endian structs, identified by
+their first byte; prices are integer ticks and quantities integer lots of
+the symbol's SymbolSpec. Clients may pipeline any number of requests per
+connection: responses come back in request order, each request answered
+by zero or more FILL messages followed by one ACK.
+
+    NEW     'N' side:B order_type:B has_stop:B stp:B order_id:16s symbol:8s user_id:16s
+                price:q quantity:q stop_price:q                        (69 bytes)
+    CANCEL  'C' pad:3x order_id:16s symbol:8s                          (28 bytes)
+    MODIFY  'M' has_price:B pad:2x order_id:16s symbol:8s quantity:q price:q (44 bytes)
+
+    FILL    'F' pad:7x buy_order_id:16s sell_order_id:16s price:q quantity:q (56 bytes)
+    ACK     'A' status:B state:B pad:1x order_id:16s reason:40s         (60 bytes)
+
+Strings are UTF-8, NUL padded. side is 0 = buy, 1 = sell; order_type
+indexes ORDER_TYPES; stp is 0 for no self-trade prevention, otherwise
+1 + an index into STP_MODES. The REST API limits order ids to the same 16
+bytes (MAX_ORDER_ID_BYTES), so fills can carry any order's id. Run
+standalone with `python -m app.gateway`.
+"""
+import argparse
+import asyncio
+import struct
+import threading
+from .order_book import Order, OrderRejected, ORDER_TYPES, STP_MODES
+from .books import get_book, risk_engine
+
+NEW = struct.Struct('<cBBBB16s8s16sqqq')
+CANCEL = struct.Struct('<c3x16s8s')
+MODIFY = struct.Struct('<cB2x16s8sqq')
+FILL = struct.Struct('<c7x16s16sqq')
+ACK = struct.Struct('<cBBx16s40s')
+
+REQUESTS = {b'N': NEW, b'C': CANCEL, b'M': MODIFY}
+# Position of order_id in each request's fields
+ORDER_ID_FIELD = {b'N': 5, b'C': 1, b'M': 2}
+READ_SIZE = 65536
+# Requests applied per executor hop
+BATCH_SIZE = 256
+
+STATUS_OK, STATUS_NOT_FOUND, STATUS_REJECTED, STATUS_ERROR = range(4)
+STATES = ('none', 'resting', 'filled', 'cancelled', 'pending')
+SIDES = ('buy', 'sell')
+
+def _text(raw: bytes, errors: str = 'strict') -> str:
+    return raw.rstrip(b'\0').decode(errors=errors)
+
+def pack_new(order_id, symbol, side, price, quantity, user_id='', order_type='limit', stop_price=None,
+             stp_mode=None):
+    return NEW.pack(b'N', SIDES.index(side), ORDER_TYPES.index(order_type), stop_price is not None,
+                    STP_MODES.index(stp_mode) + 1 if stp_mode else 0, order_id.encode(), symbol.encode(),
+                    user_id.encode(), price, quantity, stop_price or 0)
+
+def pack_cancel(order_id, symbol):
+    return CANCEL.pack(b'C', order_id.encode(), symbol.encode())
+
+def pack_modify(order_id, symbol, quantity, price=None):
+    return MODIFY.pack(b'M', price is not None, order_id.encode(), symbol.encode(), quantity, price or 0)
+
+async def read_response(reader):
+    """
+    Client helper: reads one request's response and returns
+    (status, state, order_id, reason, fills) with fills as
+    (buy_order_id, sell_order_id, price, quantity) tuples.
+    """
+    fills = []
+    while True:
+        kind = await reader.readexactly(1)
+        if kind == b'F':
+            _, buy_id, sell_id, price, qty = FILL.unpack(kind + await reader.readexactly(FILL.size - 1))
+            fills.append((_text(buy_id, 'replace'), _text(sell_id, 'replace'), price, qty))
+        else:
+            _, status, state, order_id, reason = ACK.unpack(kind + await reader.readexactly(ACK.size - 1))
+            return status, STATES[state], _text(order_id, 'replace'), _text(reason, 'replace'), fills
+
+def _respond(out, order_id, status, trades=(), state='none', reason=''):
+    for trade in trades:
+        out.append(FILL.pack(b'F', trade['buy_order_id'].encode(), trade['sell_order_id'].encode(),
+                             trade['price'], trade['quantity']))
+    out.append(ACK.pack(b'A', status, STATES.index(state), order_id, reason.encode()[:40]))
+
+def handle_message(kind: bytes, fields: tuple, out: list):
+    # Applies one decoded request and appends its encoded responses to out
+    try:
+        _apply(kind, fields, out)
+    except UnicodeDecodeError:
+        _respond(out, fields[ORDER_ID_FIELD[kind]], STATUS_ERROR, reason='ids and symbol must be UTF-8')
+
+def _apply(kind: bytes, fields: tuple, out: list):
+    if kind == b'N':
+        _, side, order_type, has_stop, stp, raw_id, symbol, user_id, price, quantity, stop_price = fields
+        if side > 1 or order_type >= len(ORDER_TYPES) or stp > len(STP_MODES):
+            return _respond(out, raw_id, STATUS_ERROR, reason='bad side, order type or STP mode')
+        if price <= 0 or quantity <= 0:
+            return _respond(out, raw_id, STATUS_REJECTED, reason='price and quantity must be positive')
+        book = get_book(_text(symbol), create=True)
+        order = Order(_text(raw_id), book.symbol, SIDES[side], price, quantity,
+                      user_id=_text(user_id) or None, order_type=ORDER_TYPES[order_type],
+                      stop_price=stop_price if has_stop else None,
+                      stp_mode=STP_MODES[stp - 1] if stp else None)
+        with book.lock:
+            reason = risk_engine.check(book, order)
+            if reason is None:
+                try:
+                    trades = book.submit_order(order)
+                except OrderRejected as e:
+                    reason = str(e)
+            state = book.order_state(order)
+        if reason is not None:
+            return _respond(out, raw_id, STATUS_REJECTED, reason=reason)
+        return _respond(out, raw_id, STATUS_OK, trades, state)
+    if kind == b'C':
+        _, raw_id, symbol = fields
+        book = get_book(_text(symbol))
+        if book is None:
+            return _respond(out, raw_id, STATUS_NOT_FOUND)
+        with book.lock:
+            found = book.cancel_order(_text(raw_id))
+        return _respond(out, raw_id, STATUS_OK if found else STATUS_NOT_FOUND)
+    _, has_price, raw_id, symbol, quantity, price = fields
+    if quantity <= 0 or (has_price and price <= 0):
+        return _respond(out, raw_id, STATUS_REJECTED, reason='price and quantity must be positive')
+    book = get_book(_text(symbol))
+    if book is None:
+        return _respond(out, raw_id, STATUS_NOT_FOUND)
+    order_id = _text(raw_id)
+    price = price if has_price else None
+    try:
+        with book.lock:
+            reason = risk_engine.check_amend(book, order_id, quantity, price)
+            if reason is not None:
+                raise OrderRejected(reason)
+            trades = book.amend_order(order_id, quantity, price)
+    except OrderRejected as e:
+        return _respond(out, raw_id, STATUS_REJECTED, reason=str(e))
+    if trades is None:
+        return _respond(out, raw_id, STATUS_NOT_FOUND)
+    return _respond(out, raw_id, STATUS_OK, trades)
+
+def handle_messages(requests: list) -> list:
+    # Applies decoded requests in order and returns their encoded responses
+    out = []
+    for fields in requests:
+        handle_message(fields[0], fields, out)
+    return out
+
+def _split(buffer: bytearray):
+    # Decodes every complete request at the front of buffer and returns
+    # (requests, bytes consumed, whether an unknown message type was hit);
+    # a partial request is left for the rest to arrive
+    requests = []
+    offset = 0
+    while offset < len(buffer):
+        layout = REQUESTS.get(bytes(buffer[offset:offset + 1]))
+        if layout is None:
+            return requests, offset, True
+        if len(buffer) - offset < layout.size:
+            break
+        requests.append(layout.unpack_from(buffer, offset))
+        offset += layout.size
+    return requests, offset, False
+
+async def handle_connection(reader, writer):
+    loop = asyncio.get_running_loop()
+    buffer = bytearray()
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            buffer += data
+            requests, offset, unknown = _split(buffer)
+            del buffer[:offset]
+            # Book locks are also taken by REST threads and checkpoints, so
+            # requests run on executor threads, a batch at a time, to keep
+            # a held lock from stalling every other connection
+            for start in range(0, len(requests), BATCH_SIZE):
+                out = await loop.run_in_executor(None, handle_messages, requests[start:start + BATCH_SIZE])
+                writer.write(b''.join(out))
+                await writer.drain()
+            if unknown:
+                break  # The stream can't be resynchronised
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(host='127.0.0.1', port=9001):
+    server = await asyncio.start_server(handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
+
+def start_in_thread(host='127.0.0.1', port=9001):
+    # Runs the gateway next to the Flask app so both share the same books
+    thread = threading.Thread(target=asyncio.run, args=(serve(host, port),), daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Binary order-entry gateway')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9001)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
@@ -0,0 +1,309 @@
+import json
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional
+from .order_book import Order, OrderBook, ORDER_TYPES, STP_MODES, encode_snapshot
+
+# Journal records: <payload length:I><type:B><payload>. Strings inside a
+# payload are <length:H><utf-8 bytes>; a zero-length user id means None.
+# Ids longer than MAX_STR_BYTES cannot be journalled, so callers reject them.
+REC_ADD = 1      # add_order: rests without matching
+REC_SUBMIT = 2   # submit_order: matches, then rests the remainder
+REC_AMEND = 3
+REC_CANCEL = 4
+REC_MATCH = 5
+
+_HEADER = struct.Struct('<IB')
+_STR_LEN = struct.Struct('<H')
+MAX_STR_BYTES = 0xFFFF
+# side (1 = buy), order type index, price ticks, quantity lots, timestamp,
+# has stop, stop price ticks, STP mode (0 = none, else STP_MODES index + 1)
+_ORDER = struct.Struct('<BBqqdBqB')
+# quantity lots, has price, price ticks, timestamp (kept if the order loses priority)
+_AMEND = struct.Struct('<qBqd')
+_SNAP_HEADER = struct.Struct('<8sQI')  # magic, journal generation, book count
+_COUNT = struct.Struct('<I')
+
+SNAPSHOT_MAGIC = b'OBSNAP5\0'
+SNAPSHOT_FILE = 'snapshot.bin'
+
+def _pack_str(value: Optional[str]) -> bytes:
+    data = value.encode() if value else b''
+    return _STR_LEN.pack(len(data)) + data
+
+def _unpack_str(buf, offset: int):
+    (length,) = _STR_LEN.unpack_from(buf, offset)
+    offset += 2
+    return str(buf[offset:offset + length], 'utf-8'), offset + length
+
+def _pack_order(order: Order) -> bytes:
+    return (_pack_str(order.order_id)
+            + _ORDER.pack(order.side == 'buy', ORDER_TYPES.index(order.order_type), order.price,
+                          order.quantity, order.timestamp, order.stop_price is not None, order.stop_price or 0,
+                          STP_MODES.index(order.stp_mode) + 1 if order.stp_mode else 0)
+            + _pack_str(order.user_id))
+
+def _unpack_order(buf, offset: int, symbol: str):
+    order_id, offset = _unpack_str(buf, offset)
+    is_buy, order_type, price, quantity, timestamp, has_stop, stop_price, stp = _ORDER.unpack_from(buf, offset)
+    user_id, offset = _unpack_str(buf, offset + _ORDER.size)
+    order = Order(order_id=order_id, symbol=symbol, side='buy' if is_buy else 'sell',
+                  price=price, quantity=quantity, timestamp=timestamp, user_id=user_id or None,
+                  order_type=ORDER_TYPES[order_type], stop_price=stop_price if has_stop else None,
+                  stp_mode=STP_MODES[stp - 1] if stp else None)
+    return order, offset
+
+def _journal_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f'journal-{generation}.bin')
+
+class Journal:
+    """
+    Append-only binary write-ahead log of accepted OrderBook commands.
+    Books call the record_* methods before applying a command; since
+    matching is deterministic, replaying the commands in order rebuilds
+    both the books and their PnL. Writes are buffered and fsynced in
+    batches (every sync_every records or sync_interval seconds, whichever
+    comes first); a background thread syncs records still pending once
+    sync_interval has passed, so a burst followed by silence is not left
+    in the buffer. Call sync() for an explicit durability point.
+    checkpoint() writes a compact snapshot and starts a fresh journal
+    generation, so recovery is snapshot load plus a short tail replay.
+    """
+    def __init__(self, directory: str, generation: int = 0,
+                 sync_every: int = 1000, sync_interval: float = 0.05):
+        self.directory = directory
+        self.generation = generation
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._closed = False
+        self._pending = threading.Condition(self.lock)
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(_journal_path(directory, generation), 'ab')
+        self._flusher = threading.Thread(target=self._flush_pending, daemon=True)
+        self._flusher.start()
+
+    def _append(self, record_type: int, payload: bytes):
+        with self.lock:
+            self._file.write(_HEADER.pack(len(payload), record_type) + payload)
+            self._unsynced += 1
+            if (self._unsynced >= self.sync_every
+                    or time.monotonic() - self._last_sync >= self.sync_interval):
+                self._sync()
+            elif self._unsynced == 1:
+                self._pending.notify()
+
+    def _flush_pending(self):
+        # Background flusher: syncs records that no later append has synced
+        # within sync_interval of the last sync
+        with self.lock:
+            while not self._closed:
+                if not self._unsynced:
+                    self._pending.wait()
+                    continue
+                remaining = self._last_sync + self.sync_interval - time.monotonic()
+                if remaining > 0:
+                    self._pending.wait(remaining)
+                else:
+                    self._sync()
+
+    def record_add(self, order: Order, aggressive: bool):
+        self._append(REC_SUBMIT if aggressive else REC_ADD,
+                     _pack_str(order.symbol) + _pack_order(order))
+
+    def record_amend(self, symbol: str, order_id: str, new_quantity: int, new_price: Optional[int],
+                     timestamp: float):
+        self._append(REC_AMEND, _pack_str(symbol) + _pack_str(order_id)
+                     + _AMEND.pack(new_quantity, new_price is not None, new_price or 0, timestamp))
+
+    def record_cancel(self, symbol: str, order_id: str):
+        self._append(REC_CANCEL, _pack_str(symbol) + _pack_str(order_id))
+
+    def record_match(self, symbol: str):
+        self._append(REC_MATCH, _pack_str(symbol))
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def close(self):
+        with self.lock:
+            self._sync()
+            self._file.close()
+            self._closed = True
+            self._pending.notify()
+        self._flusher.join()
+
+    def checkpoint(self, books: Dict[str, OrderBook]):
+        """
+        Snapshots books and rotates to a new journal generation. The caller
+        must stop every book from changing (hold all book locks) meanwhile.
+        """
+        self.finish_checkpoint(self.begin_checkpoint(books))
+
+    def begin_checkpoint(self, books: Dict[str, OrderBook]):
+        """
+        The part of checkpoint() that needs the books frozen: captures their
+        state (OrderBook.capture()) and rotates to a new journal generation.
+        Pass the result to finish_checkpoint() after releasing the books.
+        Checkpoints must not overlap: finish one before beginning the next.
+        """
+        captured = capture_books(books)
+        with self.lock:
+            self._sync()
+            self._file.close()
+            self.generation += 1
+            self._file = open(_journal_path(self.directory, self.generation), 'ab')
+            return self.generation, captured
+
+    def finish_checkpoint(self, checkpoint):
+        """
+        Encodes and writes the snapshot begun by begin_checkpoint(), then
+        deletes the journal generations it replaces. Until the snapshot is
+        in place, recover() replays those generations instead.
+        """
+        generation, captured = checkpoint
+        write_snapshot(self.directory, captured, generation)
+        for old in range(generation - 1, -1, -1):
+            path = _journal_path(self.directory, old)
+            if not os.path.exists(path):
+                break
+            os.remove(path)
+
+def capture_books(books: Dict[str, OrderBook]):
+    # Copies what write_snapshot() needs while the books are frozen: each
+    # book's OrderBook.capture() with the index of its PnL tracker, and
+    # each distinct tracker's state as JSON (trackers may be shared
+    # between books, so each is written once and referenced by index)
+    trackers = []
+    captured = []
+    for symbol, book in books.items():
+        if not any(t is book.pnl_tracker for t in trackers):
+            trackers.append(book.pnl_tracker)
+        index = next(i for i, t in enumerate(trackers) if t is book.pnl_tracker)
+        captured.append((symbol, index, book.capture()))
+    return captured, [json.dumps(tracker.state()).encode() for tracker in trackers]
+
+def write_snapshot(directory: str, captured, generation: int):
+    # Each book is stored in the OrderBook.snapshot() format, which keeps
+    # time priority and pending stops, followed by the PnL trackers
+    books, trackers = captured
+    parts = [_SNAP_HEADER.pack(SNAPSHOT_MAGIC, generation, len(books))]
+    for symbol, index, book in books:
+        data = encode_snapshot(book)
+        parts.append(_pack_str(symbol))
+        parts.append(_COUNT.pack(index))
+        parts.append(_COUNT.pack(len(data)))
+        parts.append(data)
+    parts.append(_COUNT.pack(len(trackers)))
+    for pnl in trackers:
+        parts.append(_COUNT.pack(len(pnl)))
+        parts.append(pnl)
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(b''.join(parts))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def load_snapshot(directory: str, make_book: Callable[[str], OrderBook]):
+    """Returns (books, generation) from the snapshot, or ({}, 0) if none."""
+    path = os.path.join(directory, SNAPSHOT_FILE)
+    if not os.path.exists(path):
+        return {}, 0
+    with open(path, 'rb') as f:
+        buf = memoryview(f.read())
+    magic, generation, count = _SNAP_HEADER.unpack_from(buf, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f'{path} is not an order book snapshot')
+    offset = _SNAP_HEADER.size
+    books = {}
+    tracker_books = {}
+    for _ in range(count):
+        symbol, offset = _unpack_str(buf, offset)
+        book = books[symbol] = make_book(symbol)
+        index, length = struct.unpack_from('<II', buf, offset)
+        tracker_books.setdefault(index, book)
+        offset += 8
+        book.restore(buf[offset:offset + length])
+        offset += length
+    (trackers,) = _COUNT.unpack_from(buf, offset)
+    offset += 4
+    for index in range(trackers):
+        (length,) = _COUNT.unpack_from(buf, offset)
+        offset += 4
+        state = json.loads(bytes(buf[offset:offset + length]))
+        tracker_books[index].pnl_tracker.load_state(state)
+        offset += length
+    return books, generation
+
+def replay(path: str, books: Dict[str, OrderBook], make_book: Callable[[str], OrderBook]) -> int:
+    """
+    Re-applies journal records to books (creating missing ones) and returns
+    the number of bytes of complete records. A torn record at the tail,
+    left by a crash mid-write, ends the replay.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        buf = memoryview(f.read())
+    end = len(buf)
+    offset = 0
+    header_size = _HEADER.size
+    unpack_header = _HEADER.unpack_from
+    while offset + header_size <= end:
+        length, record_type = unpack_header(buf, offset)
+        start = offset + header_size
+        if start + length > end:
+            break
+        symbol, pos = _unpack_str(buf, start)
+        book = books.get(symbol)
+        if book is None:
+            book = books[symbol] = make_book(symbol)
+        if record_type == REC_SUBMIT:
+            book.submit_order(_unpack_order(buf, pos, symbol)[0])
+        elif record_type == REC_CANCEL:
+            book.cancel_order(_unpack_str(buf, pos)[0])
+        elif record_type == REC_AMEND:
+            order_id, pos = _unpack_str(buf, pos)
+            quantity, has_price, price, timestamp = _AMEND.unpack_from(buf, pos)
+            book.amend_order(order_id, quantity, price if has_price else None, timestamp)
+        elif record_type == REC_ADD:
+            book.add_order(_unpack_order(buf, pos, symbol)[0])
+        elif record_type == REC_MATCH:
+            book.match_orders()
+        offset = start + length
+    return offset
+
+def recover(directory: str, make_book: Callable[[str], OrderBook] = OrderBook):
+    """
+    Rebuilds books from the latest snapshot plus the journal tail and
+    returns (books, journal) with the journal attached to every book and
+    opened for appending after the last complete record. The tail is
+    every generation from the snapshot's on: a checkpoint interrupted
+    before its snapshot was written leaves more than one.
+    """
+    books, generation = load_snapshot(directory, make_book)
+    while True:
+        path = _journal_path(directory, generation)
+        valid = replay(path, books, make_book)
+        if not os.path.exists(_journal_path(directory, generation + 1)):
+            break
+        generation += 1
+    if os.path.exists(path) and os.path.getsize(path) > valid:
+        with open(path, 'r+b') as f:
+            f.truncate(valid)
+    journal = Journal(directory, generation)
+    for book in books.values():
+        book.journal = journal
+    return books, journal
@@ -1,100 +1,804 @@
-
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional
+from decimal import Decimal
+from typing import List, Dict, Optional, Callable
+from bisect import bisect_left
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from itertools import repeat
+from operator import attrgetter
+import gc
+import math
+import struct
+import sys
+import threading
 import time
 from app.pnl import PnLTracker
 
-@dataclass
+def _decimals(step: float) -> int:
+    return max(0, -Decimal(str(step)).normalize().as_tuple().exponent)
+
+@dataclass(frozen=True)
+class SymbolSpec:
+    """
+    Price and quantity increments for a symbol. The book matches on exact
+    integer ticks and lots; these convert to and from decimal values at the
+    API boundary and reject values that are not whole increments.
+    """
+    tick_size: float = 1
+    lot_size: float = 1
+
+    def _to_units(self, value: float, step: float, name: str) -> int:
+        if not math.isfinite(value):
+            raise ValueError(f'{name} must be finite')
+        units = round(value / step)
+        if abs(units * step - value) > step * 1e-6:
+            raise ValueError(f'{name} {value} is not a multiple of {step}')
+        return units
+
+    def to_ticks(self, price: float) -> int:
+        return self._to_units(price, self.tick_size, 'price')
+
+    def to_lots(self, quantity: float) -> int:
+        return self._to_units(quantity, self.lot_size, 'quantity')
+
+    def to_price(self, ticks: int) -> float:
+        return round(ticks * self.tick_size, _decimals(self.tick_size))
+
+    def to_quantity(self, lots: int) -> float:
+        return round(lots * self.lot_size, _decimals(self.lot_size))
+
+# 'limit' rests any remainder; 'ioc' cancels it; 'fok' fills completely or
+# not at all; 'post_only' is rejected instead of crossing the spread
+ORDER_TYPES = ('limit', 'ioc', 'fok', 'post_only')
+
+# Self-trade prevention, applied when an order would trade against another
+# order from the same user_id: 'cancel_newest' cancels the incoming order,
+# 'cancel_oldest' cancels the resting one and keeps matching, and
+# 'decrement_both' reduces both by the smaller quantity without a trade
+STP_MODES = ('cancel_newest', 'cancel_oldest', 'decrement_both')
+
+# Longest order id, in UTF-8 bytes, accepted at the API boundary: fills
+# report both order ids in the binary gateway's fixed-width fields
+MAX_ORDER_ID_BYTES = 16
+
+# OrderBook.snapshot() layout: this header (magic, bid levels, ask levels,
+# resting orders, stops, distinct users, has last trade, last trade price),
+# the symbol, then little-endian columns: level prices and order counts
+# (bids then asks, best first), and per order its price, quantity,
+# timestamp, side, type, STP mode and user index, then the stops' stop
+# prices; order ids and user ids follow as NUL-separated UTF-8 blobs.
+_SNAPSHOT_MAGIC = b'OBOOK1\0\0'
+_SNAPSHOT_HEADER = struct.Struct('<8sIIIIIBq')
+_BLOB_LEN = struct.Struct('<I')
+
+class OrderRejected(ValueError):
+    pass
+
+@dataclass(slots=True)
 class Order:
     order_id: str
     symbol: str
     side: str  # 'buy' or 'sell'
-    price: float
-    quantity: float
-    timestamp: float = field(default_factory=lambda: time.time())
+    price: int  # in ticks of the symbol's tick_size
+    quantity: int  # in lots of the symbol's lot_size
+    timestamp: float = field(default_factory=time.time)
+    user_id: Optional[str] = None
+    order_type: str = 'limit'
+    # Stop orders wait off-book until a trade prints at or through this
+    # price (ticks), then enter as their order_type at `price`
+    stop_price: Optional[int] = None
+    # One of STP_MODES, or None to allow trading against the same user
+    stp_mode: Optional[str] = None
+    # Intrusive queue links, owned by the PriceLevel the order rests in
+    prev: Optional['Order'] = field(default=None, repr=False, compare=False)
+    next: Optional['Order'] = field(default=None, repr=False, compare=False)
+    level: Optional['PriceLevel'] = field(default=None, repr=False, compare=False)
+
+class PriceLevel:
+    """
+    FIFO queue of the orders resting at one price, linked through the orders
+    themselves so any order can be unlinked in O(1) given only the Order.
+    total is the aggregate resting quantity, kept current by the book.
+    """
+    def __init__(self, price: int):
+        self.price = price
+        self.head: Optional[Order] = None
+        self.tail: Optional[Order] = None
+        self.count = 0
+        self.total = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        order = self.head
+        while order is not None:
+            yield order
+            order = order.next
+
+    def append(self, order: Order):
+        order.level = self
+        order.prev = self.tail
+        order.next = None
+        if self.tail is None:
+            self.head = order
+        else:
+            self.tail.next = order
+        self.tail = order
+        self.count += 1
+        self.total += order.quantity
+
+    def unlink(self, order: Order):
+        if order.prev is None:
+            self.head = order.next
+        else:
+            order.prev.next = order.next
+        if order.next is None:
+            self.tail = order.prev
+        else:
+            order.next.prev = order.prev
+        order.prev = order.next = order.level = None
+        self.count -= 1
+        self.total -= order.quantity
+
+class BookSide:
+    """
+    One side of the book: price levels, each holding a FIFO queue of orders.
+    Level keys are kept sorted so the best price is always the last element
+    (bids key by price, asks by -price); consuming the best level is a pop()
+    from the end and new levels near the touch only shift a few entries.
+    """
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.keys: List[int] = []
+        self.levels: Dict[int, PriceLevel] = {}
+        # Prices whose aggregate changed since the book last published
+        self.touched = set()
+
+    def _key(self, price: int) -> int:
+        return price if self.is_bid else -price
+
+    def __len__(self):
+        return sum(level.count for level in self.levels.values())
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def __iter__(self):
+        # Orders in priority order: best price first, then time
+        for _, level in self.price_levels():
+            yield from level
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def add(self, order: Order):
+        level = self.levels.get(order.price)
+        if level is None:
+            level = self.levels[order.price] = PriceLevel(order.price)
+            key = self._key(order.price)
+            self.keys.insert(bisect_left(self.keys, key), key)
+        level.append(order)
+        self.touched.add(order.price)
+
+    def remove(self, order: Order):
+        level = order.level
+        level.unlink(order)
+        self.touched.add(level.price)
+        if not level.count:
+            self._drop_level(level.price)
+
+    def _drop_level(self, price: int):
+        del self.levels[price]
+        key = self._key(price)
+        index = len(self.keys) - 1
+        if self.keys[index] != key:
+            index = bisect_left(self.keys, key)
+        del self.keys[index]
+
+    def price_levels(self, limit: Optional[int] = None):
+        # (price, PriceLevel) pairs from the best price outwards
+        keys = reversed(self.keys) if limit is None else self.keys[:-limit - 1:-1]
+        for key in keys:
+            price = key if self.is_bid else -key
+            yield price, self.levels[price]
+
+    def best_price(self) -> Optional[int]:
+        if not self.keys:
+            return None
+        key = self.keys[-1]
+        return key if self.is_bid else -key
+
+    def best_level(self) -> PriceLevel:
+        return self.levels[self.best_price()]
+
+class StopIndex:
+    """
+    Pending stop orders for one side, indexed by stop price. Keys are kept
+    sorted so the next stop to trigger is always last (buy stops key by
+    -stop_price, sell stops by stop_price); a trade only pops the stops it
+    actually triggers instead of scanning them all.
+    """
+    def __init__(self, is_buy: bool):
+        self.is_buy = is_buy
+        self.keys: List[int] = []
+        self.stops: Dict[int, Dict[str, Order]] = {}
+
+    def __len__(self):
+        return sum(len(orders) for orders in self.stops.values())
+
+    def add(self, order: Order):
+        orders = self.stops.get(order.stop_price)
+        if orders is None:
+            orders = self.stops[order.stop_price] = {}
+            key = -order.stop_price if self.is_buy else order.stop_price
+            self.keys.insert(bisect_left(self.keys, key), key)
+        orders[order.order_id] = order
+
+    def remove(self, order: Order):
+        orders = self.stops[order.stop_price]
+        del orders[order.order_id]
+        if not orders:
+            del self.stops[order.stop_price]
+            key = -order.stop_price if self.is_buy else order.stop_price
+            del self.keys[bisect_left(self.keys, key)]
+
+    def pop_triggered(self, low: int, high: int) -> List[Order]:
+        # Buy stops trigger at or above their stop, sell stops at or below
+        triggered = []
+        while self.keys:
+            stop = -self.keys[-1] if self.is_buy else self.keys[-1]
+            if (high < stop) if self.is_buy else (low > stop):
+                break
+            self.keys.pop()
+            triggered.extend(self.stops.pop(stop).values())
+        return triggered
 
 class OrderBook:
-    def __init__(self, symbol: str):
+    """
+    Prices and quantities inside the book (orders, levels, trades, depth)
+    are integer ticks and lots; spec converts them at the API boundary.
+    """
+    def __init__(self, symbol: str, spec: Optional[SymbolSpec] = None,
+                 pnl_tracker: Optional[PnLTracker] = None):
         self.symbol = symbol
-        self.bids: List[Order] = []  # Buy orders
-        self.asks: List[Order] = []  # Sell orders
+        self.spec = spec or SymbolSpec()
+        self.bids = BookSide(is_bid=True)  # Buy orders
+        self.asks = BookSide(is_bid=False)  # Sell orders
         self.order_map: Dict[str, Order] = {}
-        self.pnl_tracker = PnLTracker()
+        # Untriggered stop orders, kept off the book
+        self.buy_stops = StopIndex(is_buy=True)
+        self.sell_stops = StopIndex(is_buy=False)
+        self.stop_map: Dict[str, Order] = {}
+        self.last_trade_price: Optional[int] = None
+        # May be shared between books to aggregate users across symbols
+        self.pnl_tracker = pnl_tracker if pnl_tracker is not None else PnLTracker()
+        # Callers sharing a book across threads hold this around each call
+        self.lock = threading.Lock()
+        # Called as listener(event, data) after each operation: 'depth' for
+        # every changed level, then 'trade' for every execution
+        self.listeners: List[Callable[[str, dict], None]] = []
+        # Write-ahead journal (app.journal.Journal); accepted commands are
+        # recorded before they are applied
+        self.journal = None
+
+    def _side(self, side: str) -> BookSide:
+        return self.bids if side == 'buy' else self.asks
+
+    def _publish(self, trades=()):
+        if not self.listeners:
+            self.bids.touched.clear()
+            self.asks.touched.clear()
+            return
+        events = []
+        for name, side in (('bids', self.bids), ('asks', self.asks)):
+            for price in side.touched:
+                level = side.levels.get(price)
+                events.append(('depth', {'side': name, 'price': price, 'quantity': level.total if level else 0}))
+            side.touched.clear()
+        events.extend(('trade', trade) for trade in trades)
+        for listener in self.listeners:
+            for event, data in events:
+                listener(event, data)
 
     def add_order(self, order: Order):
-        if order.side == 'buy':
-            self.bids.append(order)
-            self.bids.sort(key=lambda x: (-x.price, x.timestamp))
-        else:
-            self.asks.append(order)
-            self.asks.sort(key=lambda x: (x.price, x.timestamp))
+        self._check_new(order)
+        if self.journal is not None:
+            self.journal.record_add(order, aggressive=False)
+        self._add(order)
+        self._publish()
+
+    def _check_new(self, order: Order):
+        # Any other side would rest as an ask and break snapshots; a reused
+        # id would hide the earlier order from cancel and modify
+        if order.side not in ('buy', 'sell'):
+            raise OrderRejected(f'unknown side {order.side!r}')
+        if order.order_id in self.order_map or order.order_id in self.stop_map:
+            raise OrderRejected(f'duplicate order id {order.order_id!r}')
+
+    def _add(self, order: Order):
+        self._side(order.side).add(order)
         self.order_map[order.order_id] = order
 
-    def modify_order(self, order_id: str, new_quantity: float, new_price: Optional[float] = None):
+    def modify_order(self, order_id: str, new_quantity: int, new_price: Optional[int] = None):
+        return self.amend_order(order_id, new_quantity, new_price) is not None
+
+    def amend_order(self, order_id: str, new_quantity: int, new_price: Optional[int] = None,
+                    timestamp: Optional[float] = None):
+        """
+        Modifies a resting order and returns the trades it caused, or None if
+        the order is unknown. A price change that crosses the spread trades
+        immediately, like a new aggressive order. Pending stops just take
+        the new quantity and limit price. An order that loses time priority
+        is restamped with timestamp (now by default; replay passes the
+        journalled one). Raises OrderRejected, leaving the order unchanged,
+        for a quantity or price that is not positive or a post-only order
+        repriced to cross.
+        """
+        if new_quantity <= 0:
+            raise OrderRejected('quantity must be positive')
+        if new_price is not None and new_price <= 0:
+            raise OrderRejected('price must be positive')
+        if timestamp is None:
+            timestamp = time.time()
         order = self.order_map.get(order_id)
         if not order:
-            return False
+            stop = self.stop_map.get(order_id)
+            if not stop:
+                return None
+            if self.journal is not None:
+                self.journal.record_amend(self.symbol, order_id, new_quantity, new_price, timestamp)
+            stop.quantity = new_quantity
+            if new_price is not None:
+                stop.price = new_price
+            return []
+        if order.order_type == 'post_only' and new_price is not None and self._crosses(order, new_price):
+            raise OrderRejected('post-only order would cross the book')
+        if self.journal is not None:
+            self.journal.record_amend(self.symbol, order_id, new_quantity, new_price, timestamp)
+        if (new_price is not None and new_price != order.price) or new_quantity > order.quantity:
+            # Price changes and size increases lose time priority
+            self._side(order.side).remove(order)
+            del self.order_map[order_id]
+            if new_price is not None:
+                order.price = new_price
+            order.quantity = new_quantity
+            order.timestamp = timestamp
+            trades = self._submit(order)
+            self._trigger_stops(trades)
+            self._publish(trades)
+            return trades
+        # Size reductions keep their place in the queue
+        order.level.total += new_quantity - order.quantity
         order.quantity = new_quantity
-        if new_price is not None:
-            order.price = new_price
-        # Re-sort after modification
-        if order.side == 'buy':
-            self.bids.sort(key=lambda x: (-x.price, x.timestamp))
-        else:
-            self.asks.sort(key=lambda x: (x.price, x.timestamp))
-        return True
+        self._side(order.side).touched.add(order.price)
+        self._publish()
+        return []
 
     def cancel_order(self, order_id: str):
         order = self.order_map.pop(order_id, None)
         if not order:
-            return False
-        if order.side == 'buy':
-            self.bids = [o for o in self.bids if o.order_id != order_id]
-        else:
-            self.asks = [o for o in self.asks if o.order_id != order_id]
+            order = self.stop_map.pop(order_id, None)
+            if not order:
+                return False
+            if self.journal is not None:
+                self.journal.record_cancel(self.symbol, order_id)
+            (self.buy_stops if order.side == 'buy' else self.sell_stops).remove(order)
+            return True
+        if self.journal is not None:
+            self.journal.record_cancel(self.symbol, order_id)
+        self._side(order.side).remove(order)
+        self._publish()
         return True
 
-    def get_l2_depth(self):
-        # Returns aggregated price levels for bids and asks
-        def aggregate(orders):
-            levels = {}
-            for o in orders:
-                levels[o.price] = levels.get(o.price, 0) + o.quantity
-            return sorted(levels.items(), reverse=orders is self.bids)
+    def mid_price(self) -> Optional[float]:
+        # Midpoint of the best bid and ask as a real price, if both exist
+        if not self.bids or not self.asks:
+            return None
+        return self.spec.to_price(self.bids.best_price() + self.asks.best_price()) / 2
+
+    def get_l2_depth(self, levels: Optional[int] = None):
+        # Returns aggregated price levels for bids and asks, best first,
+        # optionally limited to the top `levels` on each side
+        if levels is not None and levels < 0:
+            raise ValueError('levels must not be negative')
+
+        def aggregate(side):
+            return [(price, level.total) for price, level in side.price_levels(levels)]
         return {
             'bids': aggregate(self.bids),
             'asks': aggregate(self.asks)
         }
 
+    def submit_order(self, order: Order):
+        """
+        Aggressive entry path: matches the incoming order against the opposite
+        side at the resting orders' prices and, for limit orders, rests the
+        remainder. Stop orders are parked until triggered. Returns the
+        executed trades, in the same format as match_orders, including those
+        of any stops the trades triggered. Raises OrderRejected for a
+        non-positive price or quantity, an unknown side, an order id already
+        in the book, or a post-only order that would cross.
+        """
+        if order.quantity <= 0 or order.price <= 0:
+            raise OrderRejected('price and quantity must be positive')
+        self._check_new(order)
+        if order.order_type not in ORDER_TYPES:
+            raise OrderRejected(f'unknown order type {order.order_type!r}')
+        if order.stp_mode is not None and order.stp_mode not in STP_MODES:
+            raise OrderRejected(f'unknown self-trade prevention mode {order.stp_mode!r}')
+        if order.order_type == 'post_only' and order.stop_price is None and self._crosses(order):
+            raise OrderRejected('post-only order would cross the book')
+        if self.journal is not None:
+            self.journal.record_add(order, aggressive=True)
+        if order.stop_price is not None and not self._stop_reached(order):
+            self._park_stop(order)
+            return []
+        order.stop_price = None
+        trades = self._submit(order)
+        self._trigger_stops(trades)
+        self._publish(trades)
+        return trades
+
+    def order_state(self, order: Order) -> str:
+        # Where a just-submitted order ended up
+        if self.stop_map.get(order.order_id) is order:
+            return 'pending'
+        if order.level is not None:
+            return 'resting'
+        return 'filled' if order.quantity == 0 else 'cancelled'
+
+    def _park_stop(self, order: Order):
+        self.stop_map[order.order_id] = order
+        (self.buy_stops if order.side == 'buy' else self.sell_stops).add(order)
+
+    def _stop_reached(self, order: Order) -> bool:
+        # A stop entered after the market already traded through it fires at once
+        last = self.last_trade_price
+        if last is None:
+            return False
+        return last >= order.stop_price if order.side == 'buy' else last <= order.stop_price
+
+    def _crosses(self, order: Order, price: Optional[int] = None) -> bool:
+        # Whether order (at `price`, if given) would trade on entry
+        if price is None:
+            price = order.price
+        best = (self.asks if order.side == 'buy' else self.bids).best_price()
+        if best is None:
+            return False
+        return best <= price if order.side == 'buy' else best >= price
+
+    def _fillable(self, order: Order) -> bool:
+        # Walks only the levels the order could trade against
+        is_buy = order.side == 'buy'
+        opposite = self.asks if is_buy else self.bids
+        stp_user = order.user_id if order.stp_mode else None
+        available = 0
+        for price, level in opposite.price_levels():
+            if (price > order.price) if is_buy else (price < order.price):
+                break
+            if stp_user is None:
+                available += level.total
+            else:
+                # Same-user orders don't fill: they either end the walk or
+                # (decrement_both) use up quantity without trading
+                resting = level.head
+                while resting is not None and available < order.quantity:
+                    if resting.user_id != stp_user or order.stp_mode == 'decrement_both':
+                        available += resting.quantity
+                    elif order.stp_mode == 'cancel_newest':
+                        return False
+                    resting = resting.next
+            if available >= order.quantity:
+                return True
+        return False
+
+    def _submit(self, order: Order):
+        trades = []
+        if order.order_type == 'post_only' and self._crosses(order):
+            return trades
+        if order.order_type == 'fok' and not self._fillable(order):
+            return trades
+        is_buy = order.side == 'buy'
+        opposite = self.asks if is_buy else self.bids
+        stp_user = order.user_id if order.stp_mode else None
+        while order.quantity > 0 and opposite:
+            best = opposite.best_price()
+            if (best > order.price) if is_buy else (best < order.price):
+                break
+            resting = opposite.best_level().head
+            if stp_user is not None and resting.user_id == stp_user:
+                if self._prevent_self_trade(order, resting):
+                    return trades
+                continue
+            trade_qty = min(order.quantity, resting.quantity)
+            if is_buy:
+                trades.append(self._execute(order, resting, best, trade_qty))
+            else:
+                trades.append(self._execute(resting, order, best, trade_qty))
+            if resting.quantity == 0:
+                opposite.remove(resting)
+                self.order_map.pop(resting.order_id, None)
+        if order.quantity > 0 and order.order_type in ('limit', 'post_only'):
+            self._add(order)
+        return trades
+
+    def _prevent_self_trade(self, newest: Order, oldest: Order) -> bool:
+        # Applies newest's STP mode to a match between two orders of the same
+        # user; returns True if newest was cancelled
+        mode = newest.stp_mode
+        if mode == 'cancel_newest':
+            self._drop(newest)
+            return True
+        if mode == 'cancel_oldest':
+            self._drop(oldest)
+            return False
+        quantity = min(newest.quantity, oldest.quantity)
+        for order in (newest, oldest):
+            order.quantity -= quantity
+            if order.level is not None:
+                order.level.total -= quantity
+                self._side(order.side).touched.add(order.price)
+                if order.quantity == 0:
+                    self._drop(order)
+        return False
+
+    def _drop(self, order: Order):
+        # Takes an order off the book if it is resting there
+        if order.level is not None:
+            self._side(order.side).remove(order)
+            self.order_map.pop(order.order_id, None)
+
+    def _trigger_stops(self, trades: list):
+        # Enters every stop the new trades reached; their own trades are
+        # appended to `trades` and may trigger further stops in turn
+        checked = 0
+        while checked < len(trades):
+            prices = [trade['price'] for trade in trades[checked:]]
+            checked = len(trades)
+            low, high = min(prices), max(prices)
+            triggered = self.buy_stops.pop_triggered(low, high) + self.sell_stops.pop_triggered(low, high)
+            for order in triggered:
+                del self.stop_map[order.order_id]
+                order.stop_price = None
+                trades.extend(self._submit(order))
+
+    def _execute(self, buy: Order, sell: Order, price: int, quantity: int):
+        trade = {
+            'buy_order_id': buy.order_id,
+            'sell_order_id': sell.order_id,
+            'price': price,
+            'quantity': quantity
+        }
+        self.last_trade_price = price
+        # Update PnL if user_id is present in Order
+        if buy.user_id and sell.user_id:
+            self.pnl_tracker.update_trade(buy.user_id, sell.user_id, self.symbol,
+                                          self.spec.to_price(price), self.spec.to_quantity(quantity))
+        buy.quantity -= quantity
+        sell.quantity -= quantity
+        # Keep level aggregates in step for whichever sides are resting
+        if buy.level is not None:
+            buy.level.total -= quantity
+            self.bids.touched.add(buy.price)
+        if sell.level is not None:
+            sell.level.total -= quantity
+            self.asks.touched.add(sell.price)
+        return trade
+
     def match_orders(self):
         """
         Matches buy and sell orders and returns a list of executed trades.
         Each trade is a dict: {'buy_order_id', 'sell_order_id', 'price', 'quantity'}
         Also updates PnL for users if user_id is present in Order.
+        Only needed for books filled through add_order; submit_order never
+        leaves the book crossed.
         """
         trades = []
-        while self.bids and self.asks and self.bids[0].price >= self.asks[0].price:
-            buy = self.bids[0]
-            sell = self.asks[0]
+        if (self.journal is not None and self.bids and self.asks
+                and self.bids.best_price() >= self.asks.best_price()):
+            self.journal.record_match(self.symbol)
+        while self.bids and self.asks and self.bids.best_price() >= self.asks.best_price():
+            buy = self.bids.best_level().head
+            sell = self.asks.best_level().head
+            if buy.user_id is not None and buy.user_id == sell.user_id:
+                # Both are resting, so the later arrival counts as the incoming order
+                newest, oldest = (buy, sell) if buy.timestamp >= sell.timestamp else (sell, buy)
+                if newest.stp_mode is not None:
+                    self._prevent_self_trade(newest, oldest)
+                    continue
             trade_qty = min(buy.quantity, sell.quantity)
             trade_price = sell.price  # Price is usually the passive order's price
-            trades.append({
-                'buy_order_id': buy.order_id,
-                'sell_order_id': sell.order_id,
-                'price': trade_price,
-                'quantity': trade_qty
-            })
-            # Update PnL if user_id is present in Order
-            buy_user = getattr(buy, 'user_id', None)
-            sell_user = getattr(sell, 'user_id', None)
-            if buy_user and sell_user:
-                self.pnl_tracker.update_trade(buy_user, sell_user, self.symbol, trade_price, trade_qty)
-            buy.quantity -= trade_qty
-            sell.quantity -= trade_qty
+            trades.append(self._execute(buy, sell, trade_price, trade_qty))
             if buy.quantity == 0:
-                self.bids.pop(0)
+                self.bids.remove(buy)
                 self.order_map.pop(buy.order_id, None)
             if sell.quantity == 0:
-                self.asks.pop(0)
+                self.asks.remove(sell)
                 self.order_map.pop(sell.order_id, None)
+        self._trigger_stops(trades)
+        self._publish(trades)
         return trades
+
+    def snapshot(self) -> bytes:
+        """
+        Serialises the resting orders (in priority order), pending stops and
+        last trade price into a compact binary form for restore(). PnL is
+        not included; trackers may be shared between books.
+        """
+        return encode_snapshot(self.capture())
+
+    def capture(self) -> tuple:
+        """
+        The part of snapshot() that reads the book. Callers sharing the book
+        hold its lock for this only; encode_snapshot() turns the result
+        into snapshot() bytes later without the lock. Copies the levels,
+        the order sequence and the fields that change while an order is
+        in the book (price, quantity, timestamp, stop price); the rest
+        never change, so they are read from the orders when encoding.
+        """
+        levels = [(price, level) for side in (self.bids, self.asks) for price, level in side.price_levels()]
+        with _gc_paused():
+            orders = [order for _, level in levels for order in level]
+            resting = len(orders)
+            stops = list(self.stop_map.values())
+            orders += stops
+            # map() over attrgetters keeps the per-order work in C
+            columns = (list(map(_get_price, orders)), list(map(_get_quantity, orders)),
+                       list(map(_get_timestamp, orders)), list(map(_get_stop_price, stops)))
+        return (self.symbol, len(self.bids.keys), len(self.asks.keys),
+                [(price, level.count) for price, level in levels], resting, orders, columns,
+                self.last_trade_price)
+
+    def restore(self, data: bytes) -> 'OrderBook':
+        """
+        Replaces this book's orders with those in a snapshot() of a book for
+        the same symbol, with identical queue priority, and returns the
+        book. Listeners are not notified and nothing is journalled.
+        """
+        buf = memoryview(data)
+        magic, bid_levels, ask_levels, resting, stops, user_count, has_last, last = \
+            _SNAPSHOT_HEADER.unpack_from(buf, 0)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError('not an order book snapshot')
+        offset = _SNAPSHOT_HEADER.size
+        symbol, offset = _unpack_blob(buf, offset)
+        if symbol.decode() != self.symbol:
+            raise ValueError(f'snapshot is for {symbol.decode()}, not {self.symbol}')
+        count = resting + stops
+        level_prices, offset = _read_column(buf, offset, 'q', bid_levels + ask_levels)
+        level_counts, offset = _read_column(buf, offset, 'I', bid_levels + ask_levels)
+        prices, offset = _read_column(buf, offset, 'q', count)
+        quantities, offset = _read_column(buf, offset, 'q', count)
+        timestamps, offset = _read_column(buf, offset, 'd', count)
+        sides, offset = _read_column(buf, offset, 'B', count)
+        types, offset = _read_column(buf, offset, 'B', count)
+        stp, offset = _read_column(buf, offset, 'B', count)
+        user_index, offset = _read_column(buf, offset, 'I', count)
+        stop_prices, offset = _read_column(buf, offset, 'q', stops)
+        ids, offset = _unpack_blob(buf, offset)
+        user_blob, offset = _unpack_blob(buf, offset)
+
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.buy_stops = StopIndex(is_buy=True)
+        self.sell_stops = StopIndex(is_buy=False)
+        self.stop_map = {}
+        self.last_trade_price = last if has_last else None
+        # Levels first, so each order is created already pointing at its level
+        level_of = []
+        levels = []
+        start = 0
+        for index, (price, level_count) in enumerate(zip(level_prices, level_counts)):
+            side = self.bids if index < bid_levels else self.asks
+            level = side.levels[price] = PriceLevel(price)
+            level.count = level_count
+            level.total = sum(quantities[start:start + level_count])
+            levels.append(level)
+            level_of += [level] * level_count
+            start += level_count
+        level_of += [None] * stops
+        # Levels were written best first; keys keep the best price last
+        self.bids.keys = level_prices[bid_levels - 1::-1] if bid_levels else []
+        self.asks.keys = [-price for price in reversed(level_prices[bid_levels:])]
+
+        ids = ids.decode().split('\0') if count else []
+        user_names = (None, *user_blob.decode().split('\0')) if user_count else (None,)
+        stp_names = (None, *STP_MODES)
+        with _gc_paused():
+            orders = list(map(
+                Order, ids, repeat(self.symbol, count), map(_SIDE_NAMES.__getitem__, sides), prices, quantities,
+                timestamps, map(user_names.__getitem__, user_index), map(ORDER_TYPES.__getitem__, types),
+                [None] * resting + stop_prices, map(stp_names.__getitem__, stp),
+                repeat(None, count), repeat(None, count), level_of))
+            # Link all resting orders in one chain, then cut it at level edges
+            queue = orders[:resting]
+            deque(map(setattr, queue, repeat('next'), queue[1:]), maxlen=0)
+            deque(map(setattr, queue[1:], repeat('prev'), queue), maxlen=0)
+            start = 0
+            for level in levels:
+                level.head = queue[start]
+                start += level.count
+                level.tail = queue[start - 1]
+                level.head.prev = level.tail.next = None
+            self.order_map = dict(zip(ids, queue))
+        for order in orders[resting:]:
+            self._park_stop(order)
+        return self
+
+_SIDE_NAMES = ('sell', 'buy')
+_SIDE_CODES = {'sell': 0, 'buy': 1}
+_TYPE_CODES = {name: i for i, name in enumerate(ORDER_TYPES)}
+_STP_CODES = {None: 0, **{name: i + 1 for i, name in enumerate(STP_MODES)}}
+@contextmanager
+def _gc_paused():
+    # Building a million tuples or Orders would otherwise set off repeated
+    # full collections that find nothing to free. The switch is process-wide,
+    # so collection is only postponed in other threads meanwhile.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+_get_order_id = attrgetter('order_id')
+_get_side = attrgetter('side')
+_get_price = attrgetter('price')
+_get_quantity = attrgetter('quantity')
+_get_timestamp = attrgetter('timestamp')
+_get_user_id = attrgetter('user_id')
+_get_order_type = attrgetter('order_type')
+_get_stop_price = attrgetter('stop_price')
+_get_stp_mode = attrgetter('stp_mode')
+
+def encode_snapshot(captured: tuple) -> bytes:
+    # Encodes an OrderBook.capture() in the snapshot() layout
+    symbol, bid_levels, ask_levels, levels, resting, orders, columns, last_trade_price = captured
+    prices, quantities, timestamps, stop_prices = columns
+    user_ids = list(map(_get_user_id, orders))
+    users = dict.fromkeys(user_ids)
+    users.pop(None, None)
+    user_codes = {None: 0, **{user: i + 1 for i, user in enumerate(users)}}
+    parts = [
+        _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, bid_levels, ask_levels, resting, len(orders) - resting,
+                              len(users), last_trade_price is not None, last_trade_price or 0),
+        _pack_blob(symbol.encode()),
+        _column('q', [price for price, _ in levels]),
+        _column('I', [count for _, count in levels]),
+        _column('q', prices),
+        _column('q', quantities),
+        _column('d', timestamps),
+        _column('B', map(_SIDE_CODES.__getitem__, map(_get_side, orders))),
+        _column('B', map(_TYPE_CODES.__getitem__, map(_get_order_type, orders))),
+        _column('B', map(_STP_CODES.__getitem__, map(_get_stp_mode, orders))),
+        _column('I', map(user_codes.__getitem__, user_ids)),
+        _column('q', stop_prices),
+        _pack_blob('\0'.join(map(_get_order_id, orders)).encode()),
+        _pack_blob('\0'.join(users).encode()),
+    ]
+    return b''.join(parts)
+
+def _column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+def _read_column(buf, offset: int, typecode: str, count: int):
+    column = array(typecode)
+    end = offset + count * column.itemsize
+    column.frombytes(buf[offset:end])
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tolist(), end
+
+def _pack_blob(data: bytes) -> bytes:
+    return _BLOB_LEN.pack(len(data)) + data
+
+def _unpack_blob(buf, offset: int):
+    (length,) = _BLOB_LEN.unpack_from(buf, offset)
+    offset += _BLOB_LEN.size
+    return bytes(buf[offset:offset + length]), offset + length
@@ -1,18 +1,98 @@
+import threading
+
 class PnLTracker:
+    """
+    Average-cost PnL. Each fill updates the user's position in O(1): adding
+    to a position moves its average price, reducing it realizes
+    (fill price - average price) on the closed quantity, and flipping
+    through zero opens the remainder at the fill price. Unrealized PnL is
+    (mark - average price) * quantity, marked to the symbol's last trade
+    unless other marks (e.g. the book mid) are supplied.
+    One tracker can be shared by every OrderBook to form a portfolio store
+    keyed by user; its lock makes updates from different books safe.
+    """
     def __init__(self):
-        # Maps user_id to {'realized': float, 'positions': {symbol: float}}
+        # Maps user_id to {symbol: {'quantity', 'avg_price', 'realized'}}
         self.user_pnl = {}
+        # Maps symbol to its last trade price
+        self.marks = {}
+        self.lock = threading.Lock()
 
     def update_trade(self, buy_user, sell_user, symbol, price, quantity):
         # Buyer's position increases, seller's decreases
-        self._update_position(buy_user, symbol, quantity, -price * quantity)
-        self._update_position(sell_user, symbol, -quantity, price * quantity)
+        with self.lock:
+            self._update_position(buy_user, symbol, quantity, price)
+            self._update_position(sell_user, symbol, -quantity, price)
+            self.marks[symbol] = price
+
+    def _update_position(self, user, symbol, qty_change, price):
+        if qty_change == 0:
+            return  # Nothing filled; a flat position has no average to move
+        positions = self.user_pnl.get(user)
+        if positions is None:
+            positions = self.user_pnl[user] = {}
+        pos = positions.get(symbol)
+        if pos is None:
+            pos = positions[symbol] = {'quantity': 0.0, 'avg_price': 0.0, 'realized': 0.0}
+        qty = pos['quantity']
+        # Rounded so sums of decimal lot sizes land back on exactly zero
+        new_qty = round(qty + qty_change, 10)
+        if qty == 0 or (qty > 0) == (qty_change > 0):
+            pos['avg_price'] = (pos['avg_price'] * abs(qty) + price * abs(qty_change)) / abs(new_qty)
+        else:
+            closed = min(abs(qty), abs(qty_change))
+            direction = 1 if qty > 0 else -1
+            pos['realized'] += (price - pos['avg_price']) * closed * direction
+            if new_qty == 0:
+                pos['avg_price'] = 0.0
+            elif (new_qty > 0) != (qty > 0):
+                pos['avg_price'] = price
+        pos['quantity'] = new_qty
+
+    def position(self, user, symbol):
+        # Current filled quantity; a plain lookup so risk checks stay O(1)
+        pos = self.user_pnl.get(user, {}).get(symbol)
+        return pos['quantity'] if pos else 0.0
+
+    def get_pnl(self, user, symbol=None, marks=None):
+        """
+        Returns the user's realized and unrealized PnL, gross exposure at the
+        marks, and per-symbol positions and average prices across every
+        symbol, or for one symbol only. marks overrides the last trade price
+        for the symbols it contains.
+        """
+        with self.lock:
+            return self._user_pnl(user, symbol, marks or {})
+
+    def get_bulk_pnl(self, users=None, marks=None):
+        # PnL for many users (all of them by default) under one lock hold
+        with self.lock:
+            if users is None:
+                users = list(self.user_pnl)
+            return {user: self._user_pnl(user, None, marks or {}) for user in users}
+
+    def _user_pnl(self, user, symbol, marks):
+        result = {'realized': 0.0, 'unrealized': 0.0, 'exposure': 0.0, 'positions': {}, 'avg_prices': {}}
+        for sym, pos in self.user_pnl.get(user, {}).items():
+            if symbol is not None and sym != symbol:
+                continue
+            result['realized'] += pos['realized']
+            result['positions'][sym] = pos['quantity']
+            result['avg_prices'][sym] = pos['avg_price']
+            mark = marks.get(sym, self.marks.get(sym))
+            if pos['quantity'] and mark is not None:
+                result['unrealized'] += (mark - pos['avg_price']) * pos['quantity']
+                result['exposure'] += abs(pos['quantity']) * mark
+        return result
+
+    def state(self):
+        with self.lock:
+            return {'users': self.user_pnl, 'marks': self.marks}
 
-    def _update_position(self, user, symbol, qty_change, pnl_change):
-        if user not in self.user_pnl:
-            self.user_pnl[user] = {'realized': 0.0, 'positions': {}}
-        self.user_pnl[user]['realized'] += pnl_change
-        self.user_pnl[user]['positions'][symbol] = self.user_pnl[user]['positions'].get(symbol, 0.0) + qty_change
+    def load_state(self, state):
+        with self.lock:
+            self.user_pnl = state['users']
+            self.marks = state['marks']
 
-    def get_pnl(self, user):
-        return self.user_pnl.get(user, {'realized': 0.0, 'positions': {}})
+    def clear(self):
+        self.load_state({'users': {}, 'marks': {}})
@@ -0,0 +1,124 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from .order_book import Order, OrderBook
+
+class RiskCheck(ABC):
+    """
+    One pre-trade check. check() returns None to accept the order or a
+    reject reason. Checks run on every order entry, so each one keeps
+    whatever running state it needs and answers in O(1). Callers hold
+    only the order's book lock, so state shared across symbols needs its
+    own lock. reset() clears that state.
+    """
+    @abstractmethod
+    def check(self, book: OrderBook, order: Order) -> Optional[str]:
+        pass
+
+    def reset(self):
+        pass
+
+class MaxOrderSize(RiskCheck):
+    def __init__(self, max_quantity: float):
+        self.max_quantity = max_quantity
+
+    def check(self, book, order):
+        if book.spec.to_quantity(order.quantity) > self.max_quantity:
+            return f'order quantity exceeds {self.max_quantity}'
+        return None
+
+class PriceBand(RiskCheck):
+    # Rejects limit prices more than `fraction` away from the last trade
+    def __init__(self, fraction: float):
+        self.fraction = fraction
+
+    def check(self, book, order):
+        last = book.last_trade_price
+        if last is not None and abs(order.price - last) > last * self.fraction:
+            return f'price outside {self.fraction:.0%} band around last trade {book.spec.to_price(last)}'
+        return None
+
+class PositionLimit(RiskCheck):
+    """
+    Rejects orders that would take the user's filled position in the symbol,
+    as held by the book's PnL tracker, beyond +/- max_position if the order
+    filled completely. Resting orders are not counted.
+    """
+    def __init__(self, max_position: float):
+        self.max_position = max_position
+
+    def check(self, book, order):
+        if order.user_id is None:
+            return None
+        position = book.pnl_tracker.position(order.user_id, book.symbol)
+        quantity = book.spec.to_quantity(order.quantity)
+        position += quantity if order.side == 'buy' else -quantity
+        if abs(position) > self.max_position:
+            return f'position would exceed {self.max_position}'
+        return None
+
+class MessageRate(RiskCheck):
+    # Token bucket per user: bursts up to max_messages, refilled over per_seconds.
+    # Buckets span symbols, so they are guarded by their own lock.
+    def __init__(self, max_messages: int, per_seconds: float = 1.0):
+        self.capacity = max_messages
+        self.refill_rate = max_messages / per_seconds
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def check(self, book, order):
+        if order.user_id is None:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            tokens, last = self.buckets.get(order.user_id, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.refill_rate)
+            if tokens < 1:
+                self.buckets[order.user_id] = (tokens, now)
+                return f'message rate exceeds {self.capacity} per {self.capacity / self.refill_rate:g}s'
+            self.buckets[order.user_id] = (tokens - 1, now)
+        return None
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+class RiskEngine:
+    """
+    Pre-trade risk stage run in front of OrderBook.submit_order, while the
+    caller holds the book lock. Checks run in order and the first reject
+    wins, so cheap checks should come first.
+    """
+    def __init__(self, checks: Optional[List[RiskCheck]] = None):
+        self.checks = list(checks or [])
+
+    def check(self, book: OrderBook, order: Order) -> Optional[str]:
+        for risk_check in self.checks:
+            reason = risk_check.check(book, order)
+            if reason is not None:
+                return reason
+        return None
+
+    def check_amend(self, book: OrderBook, order_id: str, new_quantity: int,
+                    new_price: Optional[int] = None) -> Optional[str]:
+        """
+        Checks an amend of a resting or pending order. Repricing or growing
+        an order re-enters it like a new one, so the change is checked as
+        an order for the added quantity at the new price; reductions in
+        place and unknown ids pass (amend_order handles those).
+        """
+        order = book.order_map.get(order_id) or book.stop_map.get(order_id)
+        if order is None:
+            return None
+        price = order.price if new_price is None else new_price
+        if price == order.price and new_quantity <= order.quantity:
+            return None
+        change = Order(order.order_id, order.symbol, order.side, price, max(new_quantity - order.quantity, 0),
+                       user_id=order.user_id, order_type=order.order_type)
+        return self.check(book, change)
+
+    def reset(self):
+        # Clears every check's running state (e.g. rate buckets)
+        for risk_check in self.checks:
+            risk_check.reset()
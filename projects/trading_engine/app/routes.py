@@ -1,76 +1,309 @@
-from flask import Flask, request, jsonify
-from .order_book import OrderBook, Order
-from .pnl import PnLTracker
+import math
+import os
+from flask import Flask, Response, request, jsonify
+from .order_book import Order, OrderRejected, MAX_ORDER_ID_BYTES
+from .journal import MAX_STR_BYTES
+from .books import order_books, pnl_tracker, risk_engine, get_book, get_feed, get_tape, mid_marks, enable_journal
+from .feed import format_sse
+from .tape import BAR_INTERVALS
 
 app = Flask(__name__)
 
-# For demo, use a single symbol and order book
-order_books = {'BTCUSD': OrderBook('BTCUSD')}
+# Books work in integer ticks and lots; these helpers convert at the JSON
+# boundary using the book's SymbolSpec
+
+def _positive(units, name):
+    if units <= 0:
+        raise ValueError(f'{name} must be positive')
+    return units
+
+def _id(value, name, optional=False, max_bytes=MAX_STR_BYTES):
+    # Ids are journalled as length-prefixed UTF-8 and snapshotted NUL
+    # separated; JSON integers are taken as their decimal text
+    if value is None and optional:
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value or '\0' in value:
+        raise ValueError(f'{name} must be a non-empty string without NUL characters')
+    if len(value.encode()) > max_bytes:
+        raise ValueError(f'{name} is longer than {max_bytes} bytes')
+    return value
+
+def _order_id(data):
+    return _id(data['order_id'], 'order_id', max_bytes=MAX_ORDER_ID_BYTES)
+
+def _make_order(data, book):
+    return Order(
+        order_id=_order_id(data),
+        symbol=book.symbol,
+        side=data['side'],
+        price=_positive(book.spec.to_ticks(float(data['price'])), 'price'),
+        quantity=_positive(book.spec.to_lots(float(data['quantity'])), 'quantity'),
+        user_id=_id(data.get('user_id'), 'user_id', optional=True),
+        order_type=data.get('order_type', 'limit'),
+        stop_price=book.spec.to_ticks(float(data['stop_price'])) if 'stop_price' in data else None,
+        stp_mode=data.get('stp')
+    )
+
+def _amend(book, data):
+    # Caller holds the book lock; amends that reprice or grow pass the risk stage
+    quantity = _positive(book.spec.to_lots(float(data['quantity'])), 'quantity')
+    price = _positive(book.spec.to_ticks(float(data['price'])), 'price') if 'price' in data else None
+    order_id = _order_id(data)
+    reason = risk_engine.check_amend(book, order_id, quantity, price)
+    if reason is not None:
+        raise OrderRejected(reason)
+    return book.amend_order(order_id, quantity, price)
+
+def _trades_json(book, trades):
+    spec = book.spec
+    return [dict(trade, price=spec.to_price(trade['price']), quantity=spec.to_quantity(trade['quantity']))
+            for trade in trades]
+
+def _levels_json(book, levels):
+    spec = book.spec
+    return [(spec.to_price(price), spec.to_quantity(qty)) for price, qty in levels]
 
 @app.route('/order', methods=['POST'])
 def add_order():
     data = request.json
     symbol = data.get('symbol', 'BTCUSD')
-    if symbol not in order_books:
-        order_books[symbol] = OrderBook(symbol)
-    order = Order(
-        order_id=data['order_id'],
-        symbol=symbol,
-        side=data['side'],
-        price=float(data['price']),
-        quantity=float(data['quantity'])
-    )
-    if 'user_id' in data:
-        order.user_id = data['user_id']
-    order_books[symbol].add_order(order)
-    return jsonify({'status': 'ok'})
+    book = get_book(symbol, create=True)
+    try:
+        order = _make_order(data, book)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'reason': str(e)}), 400
+    with book.lock:
+        reason = risk_engine.check(book, order)
+        if reason is None:
+            try:
+                trades = book.submit_order(order)
+            except OrderRejected as e:
+                reason = str(e)
+        state = book.order_state(order)
+    if reason is not None:
+        return jsonify({'status': 'rejected', 'reason': reason})
+    return jsonify({'status': 'ok', 'state': state, 'trades': _trades_json(book, trades)})
 
 @app.route('/order/modify', methods=['POST'])
 def modify_order():
     data = request.json
-    symbol = data.get('symbol', 'BTCUSD')
-    if symbol not in order_books:
+    book = get_book(data.get('symbol', 'BTCUSD'))
+    if book is None:
         return jsonify({'status': 'not found'})
-    result = order_books[symbol].modify_order(
-        data['order_id'],
-        float(data['quantity']),
-        float(data['price']) if 'price' in data else None
-    )
-    return jsonify({'status': 'ok' if result else 'not found'})
+    try:
+        with book.lock:
+            trades = _amend(book, data)
+    except OrderRejected as e:
+        return jsonify({'status': 'rejected', 'reason': str(e)})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'reason': str(e)}), 400
+    if trades is None:
+        return jsonify({'status': 'not found'})
+    return jsonify({'status': 'ok', 'trades': _trades_json(book, trades)})
 
 @app.route('/order/cancel', methods=['POST'])
 def cancel_order():
     data = request.json
-    symbol = data.get('symbol', 'BTCUSD')
-    if symbol not in order_books:
+    book = get_book(data.get('symbol', 'BTCUSD'))
+    if book is None:
         return jsonify({'status': 'not found'})
-    result = order_books[symbol].cancel_order(data['order_id'])
+    try:
+        order_id = _order_id(data)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'reason': str(e)}), 400
+    with book.lock:
+        result = book.cancel_order(order_id)
     return jsonify({'status': 'ok' if result else 'not found'})
 
+def _apply_operation(book, op):
+    # Applies one batch operation to its book and returns its result dict
+    action = op.get('op', 'add')
+    try:
+        if action == 'add':
+            order = _make_order(op, book)
+            reason = risk_engine.check(book, order)
+            if reason is not None:
+                return {'status': 'rejected', 'reason': reason}
+            trades = book.submit_order(order)
+            return {'status': 'ok', 'state': book.order_state(order), 'trades': _trades_json(book, trades)}
+        elif action == 'modify':
+            trades = _amend(book, op)
+        elif action == 'cancel':
+            trades = [] if book.cancel_order(_order_id(op)) else None
+        else:
+            return {'status': 'error', 'reason': f'unknown op {action!r}'}
+    except OrderRejected as e:
+        return {'status': 'rejected', 'reason': str(e)}
+    except (KeyError, TypeError, ValueError) as e:
+        return {'status': 'error', 'reason': f'bad operation: {e}'}
+    if trades is None:
+        return {'status': 'not found'}
+    return {'status': 'ok', 'trades': _trades_json(book, trades)}
+
+@app.route('/orders/batch', methods=['POST'])
+def batch_orders():
+    """
+    Applies a list of add/modify/cancel operations, possibly across symbols.
+    Operations are grouped by symbol and each book is processed in one pass,
+    keeping the submitted order within a symbol and taking each book's lock
+    once. Results line up with the input operations.
+    """
+    operations = request.json.get('operations', [])
+    by_symbol = {}
+    for index, op in enumerate(operations):
+        by_symbol.setdefault(op.get('symbol', 'BTCUSD'), []).append(index)
+    results = [None] * len(operations)
+    all_trades = []
+    for symbol, indexes in by_symbol.items():
+        create = any(operations[i].get('op', 'add') == 'add' for i in indexes)
+        book = get_book(symbol, create=create)
+        if book is None:
+            for i in indexes:
+                results[i] = {'status': 'not found'}
+            continue
+        with book.lock:
+            for i in indexes:
+                result = _apply_operation(book, operations[i])
+                results[i] = result
+                all_trades.extend(result.get('trades', ()))
+    return jsonify({'results': results, 'trades': all_trades})
+
 @app.route('/depth', methods=['GET'])
 def get_depth():
-    symbol = request.args.get('symbol', 'BTCUSD')
-    if symbol not in order_books:
+    book = get_book(request.args.get('symbol', 'BTCUSD'))
+    levels = request.args.get('levels', type=int)
+    if levels is not None and levels < 0:
+        return jsonify({'status': 'error', 'reason': 'levels must not be negative'}), 400
+    if book is None:
         return jsonify({'bids': [], 'asks': []})
-    depth = order_books[symbol].get_l2_depth()
-    return jsonify(depth)
+    with book.lock:
+        depth = book.get_l2_depth(levels)
+    return jsonify({side: _levels_json(book, depth[side]) for side in depth})
 
 @app.route('/match', methods=['POST'])
 def match():
-    symbol = request.json.get('symbol', 'BTCUSD')
-    if symbol not in order_books:
+    book = get_book(request.json.get('symbol', 'BTCUSD'))
+    if book is None:
         return jsonify({'trades': []})
-    trades = order_books[symbol].match_orders()
-    return jsonify({'trades': trades})
+    with book.lock:
+        trades = book.match_orders()
+    return jsonify({'trades': _trades_json(book, trades)})
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    """
+    Server-sent events feed of 'depth' level updates and 'trade' prints for
+    a symbol. Every event id is its sequence number; reconnecting clients
+    send Last-Event-ID (or ?since=SEQ) and get the missed events replayed,
+    or a 'snapshot' event when they are too far behind. Unknown symbols
+    are a 404; books are only created by orders.
+    """
+    since = request.headers.get('Last-Event-ID', request.args.get('since'))
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return jsonify({'status': 'error', 'reason': f'bad event id {since!r}'}), 400
+    feed = get_feed(request.args.get('symbol', 'BTCUSD'))
+    if feed is None:
+        return jsonify({'status': 'not found'}), 404
+    sub, catch_up = feed.subscribe(since)
+
+    def events():
+        try:
+            for message in catch_up:
+                yield format_sse(message)
+            while True:
+                messages = sub.get(timeout=15)
+                if not messages:
+                    yield ': keep-alive\n\n'
+                for message in messages:
+                    yield format_sse(message)
+        finally:
+            sub.close()
+    return Response(events(), mimetype='text/event-stream')
+
+def _number_arg(name, convert, default):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = convert(value)
+        if not math.isnan(number):
+            return number
+    except ValueError:
+        pass
+    raise ValueError(f'{name} must be a number, not {value!r}')
+
+def _time_range():
+    return _number_arg('start', float, 0.0), _number_arg('end', float, math.inf)
+
+@app.route('/trades', methods=['GET'])
+def get_trades():
+    # Trades with start <= timestamp < end (epoch seconds), oldest first
+    tape = get_tape(request.args.get('symbol', 'BTCUSD'))
+    if tape is None:
+        return jsonify({'trades': []})
+    try:
+        start, end = _time_range()
+        limit = max(_number_arg('limit', int, 1000), 0)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'reason': str(e)}), 400
+    spec = tape.book.spec
+    with tape.book.lock:
+        trades = tape.query(start, end, limit)
+    return jsonify({'trades': [{'timestamp': ts, 'price': spec.to_price(price), 'quantity': spec.to_quantity(qty)}
+                               for ts, price, qty in trades]})
+
+@app.route('/bars', methods=['GET'])
+def get_bars():
+    # OHLCV bars of one interval (1s, 1m or 1h) starting in [start, end)
+    interval = request.args.get('interval', '1m')
+    if interval not in BAR_INTERVALS:
+        return jsonify({'status': 'error', 'reason': f'interval must be one of {", ".join(BAR_INTERVALS)}'}), 400
+    tape = get_tape(request.args.get('symbol', 'BTCUSD'))
+    if tape is None:
+        return jsonify({'bars': []})
+    try:
+        start, end = _time_range()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'reason': str(e)}), 400
+    spec = tape.book.spec
+    with tape.book.lock:
+        bars = tape.get_bars(interval, start, end)
+    return jsonify({'bars': [{'time': t, 'open': spec.to_price(o), 'high': spec.to_price(h), 'low': spec.to_price(l),
+                              'close': spec.to_price(c), 'volume': spec.to_quantity(v)}
+                             for t, o, h, l, c, v in bars]})
 
 @app.route('/pnl', methods=['GET'])
 def get_pnl():
-    symbol = request.args.get('symbol', 'BTCUSD')
+    """
+    Realized and unrealized PnL for a user across their whole portfolio, or
+    for one symbol. Positions are marked to the last trade price, or to the
+    book mids with mark=mid.
+    """
+    symbol = request.args.get('symbol')
     user_id = request.args.get('user_id')
-    if symbol not in order_books:
-        return jsonify({'realized': 0.0, 'positions': {}})
-    pnl = order_books[symbol].pnl_tracker.get_pnl(user_id)
-    return jsonify(pnl)
+    marks = None
+    if request.args.get('mark') == 'mid':
+        marks = mid_marks([symbol] if symbol else list(order_books))
+    return jsonify(pnl_tracker.get_pnl(user_id, symbol, marks))
+
+@app.route('/pnl/bulk', methods=['POST'])
+def get_bulk_pnl():
+    # Portfolio PnL for a list of user_ids (every known user if omitted)
+    data = request.json or {}
+    marks = mid_marks(list(order_books)) if data.get('mark') == 'mid' else None
+    return jsonify({'pnl': pnl_tracker.get_bulk_pnl(data.get('user_ids'), marks)})
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    journal_dir = os.environ.get('TRADING_JOURNAL_DIR')
+    if journal_dir:
+        enable_journal(journal_dir)
+    gateway_port = os.environ.get('TRADING_GATEWAY_PORT')
+    if gateway_port:
+        from .gateway import start_in_thread
+        start_in_thread(port=int(gateway_port))
+    # The reloader's parent process must not touch the journal or gateway as well
+    app.run(debug=True, use_reloader=not (journal_dir or gateway_port))
@@ -0,0 +1,105 @@
+"""
+Deterministic sharded exchange simulator for backtests over many symbols.
+
+Symbols are assigned to worker processes by crc32 of the symbol, so the
+same symbol always lands on the same shard. Each worker owns the OrderBooks
+of its symbols and receives its share of the input in batches over a pipe;
+since books never interact, workers run independently and the merged trade
+log is identical to applying the events one by one in a single process.
+
+Events are tuples, numbered by their position in the input:
+    ('add', symbol, order_id, side, price, quantity, user_id, order_type)
+    ('cancel', symbol, order_id)
+    ('modify', symbol, order_id, quantity, price)   # price may be None
+Prices and quantities are integer ticks and lots. An order's timestamp is its
+event number, so runs don't depend on the wall clock.
+
+Trades come back as (event number, symbol, buy_order_id, sell_order_id,
+price, quantity), ordered by event number and then execution order.
+"""
+import heapq
+import multiprocessing
+import zlib
+from typing import Dict, List, Optional, Sequence
+from .order_book import Order, OrderBook, OrderRejected
+
+def shard_of(symbol: str, shards: int) -> int:
+    # crc32 rather than hash(), which is salted differently in every process
+    return zlib.crc32(symbol.encode()) % shards
+
+def _apply(books: Dict[str, OrderBook], numbered_events, trades: list):
+    for seq, event in numbered_events:
+        op, symbol = event[0], event[1]
+        book = books.get(symbol)
+        if book is None:
+            book = books[symbol] = OrderBook(symbol)
+        if op == 'add':
+            _, _, order_id, side, price, quantity, user_id, order_type = event
+            try:
+                result = book.submit_order(Order(order_id, symbol, side, price, quantity, seq, user_id, order_type))
+            except OrderRejected:
+                continue
+        elif op == 'cancel':
+            book.cancel_order(event[2])
+            continue
+        else:
+            try:
+                result = book.amend_order(event[2], event[3], event[4]) or ()
+            except OrderRejected:
+                continue
+        for trade in result:
+            trades.append((seq, symbol, trade['buy_order_id'], trade['sell_order_id'],
+                           trade['price'], trade['quantity']))
+
+def _worker(conn):
+    books = {}
+    trades = []
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+        _apply(books, batch, trades)
+    conn.send(trades)
+    conn.close()
+
+def run(events: Sequence[tuple], workers: Optional[int] = None, batch_size: int = 5000) -> List[tuple]:
+    """
+    Applies events across `workers` processes (one per CPU by default) and
+    returns the merged trade log. workers=0 runs everything in this process,
+    which gives the reference result.
+    """
+    if workers == 0:
+        trades = []
+        _apply({}, enumerate(events), trades)
+        return trades
+    workers = workers or multiprocessing.cpu_count()
+    pipes = []
+    processes = []
+    for _ in range(workers):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_worker, args=(child,), daemon=True)
+        process.start()
+        child.close()
+        pipes.append(parent)
+        processes.append(process)
+    shard_cache = {}
+    batches = [[] for _ in range(workers)]
+    for seq, event in enumerate(events):
+        shard = shard_cache.get(event[1])
+        if shard is None:
+            shard = shard_cache[event[1]] = shard_of(event[1], workers)
+        batch = batches[shard]
+        batch.append((seq, event))
+        if len(batch) >= batch_size:
+            pipes[shard].send(batch)
+            batches[shard] = []
+    for pipe, batch in zip(pipes, batches):
+        if batch:
+            pipe.send(batch)
+        pipe.send(None)
+    # Each shard's log is already in event order; event numbers never repeat
+    # across shards, so a k-way merge reproduces the single-process order
+    logs = [pipe.recv() for pipe in pipes]
+    for process in processes:
+        process.join()
+    return list(heapq.merge(*logs, key=lambda trade: trade[0]))
@@ -0,0 +1,156 @@
+import math
+import mmap
+import os
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from typing import Callable, Optional
+from .order_book import OrderBook
+
+# Bar interval name -> length in seconds
+BAR_INTERVALS = {'1s': 1, '1m': 60, '1h': 3600}
+
+class Bars:
+    """
+    OHLCV bars of one interval in parallel arrays, keyed by bucket start
+    time. Trades arrive in time order, so each one either updates the last
+    bar or opens a new one.
+    """
+    def __init__(self, interval: int):
+        self.interval = interval
+        self.starts = array('d')
+        self.open = array('q')
+        self.high = array('q')
+        self.low = array('q')
+        self.close = array('q')
+        self.volume = array('q')
+
+    def update(self, timestamp: float, price: int, quantity: int):
+        start = math.floor(timestamp / self.interval) * self.interval
+        if self.starts and self.starts[-1] == start:
+            if price > self.high[-1]:
+                self.high[-1] = price
+            elif price < self.low[-1]:
+                self.low[-1] = price
+            self.close[-1] = price
+            self.volume[-1] += quantity
+            return
+        self.starts.append(start)
+        self.open.append(price)
+        self.high.append(price)
+        self.low.append(price)
+        self.close.append(price)
+        self.volume.append(quantity)
+
+    def query(self, start: float, end: float):
+        # Bars whose bucket starts in [start, end), as (start, o, h, l, c, v) tuples
+        lo = bisect_left(self.starts, start)
+        hi = bisect_left(self.starts, end, lo)
+        return list(zip(self.starts[lo:hi], self.open[lo:hi], self.high[lo:hi],
+                        self.low[lo:hi], self.close[lo:hi], self.volume[lo:hi]))
+
+class TradeTape:
+    """
+    Time-ordered record of every trade in one OrderBook, in ticks and lots.
+    Registered as a book listener, so it records while the book lock is held
+    and stamps each trade with clock(), clamped to never run backwards so
+    timestamps stay sorted for binary search. Trades live in parallel
+    arrays; once max_memory of them accumulate they are appended to one
+    file per column (timestamps, prices, quantities) in directory (a
+    temporary directory by default) and queries search the files through
+    mmap. OHLCV bars for BAR_INTERVALS are kept up to date on every trade.
+    """
+    COLUMNS = (('times', 'd'), ('prices', 'q'), ('quantities', 'q'))
+
+    def __init__(self, book: OrderBook, directory: Optional[str] = None,
+                 max_memory: int = 100000, clock: Callable[[], float] = time.time):
+        self.book = book
+        self.symbol = book.symbol
+        self.directory = directory
+        self.max_memory = max_memory
+        self.clock = clock
+        self.times = array('d')
+        self.prices = array('q')
+        self.quantities = array('q')
+        # Number of trades already written to the column files
+        self.spilled = 0
+        self.last_time = 0.0
+        self.bars = {name: Bars(seconds) for name, seconds in BAR_INTERVALS.items()}
+        book.listeners.append(self.on_event)
+
+    def __len__(self):
+        return self.spilled + len(self.times)
+
+    def on_event(self, event: str, data: dict):
+        if event != 'trade':
+            return
+        now = self.last_time = max(self.clock(), self.last_time)
+        price, quantity = data['price'], data['quantity']
+        self.times.append(now)
+        self.prices.append(price)
+        self.quantities.append(quantity)
+        for bars in self.bars.values():
+            bars.update(now, price, quantity)
+        if len(self.times) >= self.max_memory:
+            self.spill()
+
+    def _path(self, column: str) -> str:
+        return os.path.join(self.directory, f'{self.symbol}.{column}')
+
+    def spill(self):
+        # Appends the in-memory trades to the column files and clears them
+        if not self.times:
+            return
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='tape-')
+        os.makedirs(self.directory, exist_ok=True)
+        count = len(self.times)
+        for column, typecode in self.COLUMNS:
+            # The first spill truncates files left by an earlier process
+            with open(self._path(column), 'ab' if self.spilled else 'wb') as f:
+                getattr(self, column).tofile(f)
+            setattr(self, column, array(typecode))
+        self.spilled += count
+
+    def _read_spilled(self, start: float, end: float, limit: int):
+        with open(self._path('times'), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            times = memoryview(mm).cast('d')
+            try:
+                lo = bisect_left(times, start, 0, self.spilled)
+                hi = min(bisect_left(times, end, lo, self.spilled), lo + limit)
+                columns = [array('d', times[lo:hi])]
+            finally:
+                times.release()
+        for column, typecode in self.COLUMNS[1:]:
+            values = array(typecode)
+            with open(self._path(column), 'rb') as f:
+                f.seek(lo * values.itemsize)
+                values.fromfile(f, hi - lo)
+            columns.append(values)
+        return columns
+
+    def query(self, start: float = 0.0, end: float = math.inf, limit: int = 1000):
+        """
+        Returns up to limit trades with start <= timestamp < end, oldest
+        first, as (timestamp, price ticks, quantity lots) tuples.
+        """
+        limit = max(limit, 0)
+        result = []
+        if self.spilled:
+            result.extend(zip(*self._read_spilled(start, end, limit)))
+        remaining = limit - len(result)
+        if remaining > 0:
+            lo = bisect_left(self.times, start)
+            hi = min(bisect_left(self.times, end, lo), lo + remaining)
+            result.extend(zip(self.times[lo:hi], self.prices[lo:hi], self.quantities[lo:hi]))
+        return result
+
+    def get_bars(self, interval: str, start: float = 0.0, end: float = math.inf):
+        return self.bars[interval].query(start, end)
+
+    def clear(self):
+        self.times, self.prices, self.quantities = array('d'), array('q'), array('q')
+        self.spilled = 0
+        self.last_time = 0.0
+        self.bars = {name: Bars(seconds) for name, seconds in BAR_INTERVALS.items()}
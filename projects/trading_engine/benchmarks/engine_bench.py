@@ -0,0 +1,192 @@
+"""
+Latency and throughput benchmark for the matching engine.
+
+Replays synthetic order flow through OrderBook directly ("book") and through
+the Flask routes with the test client ("api"), and reports p50/p99/p999
+latency per operation plus sustained operations per second.
+
+Run from the project root:
+    python -m benchmarks.engine_bench                    # run and compare with the baseline
+    python -m benchmarks.engine_bench --save             # run and write a new baseline
+    python -m benchmarks.engine_bench --events 20000 --targets book
+"""
+import argparse
+import json
+import os
+import random
+import time
+from app.order_book import Order, OrderBook, SymbolSpec
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+def generate_flow(events, seed=1, rate=5000.0, cancel_ratio=0.6, modify_ratio=0.1,
+                  aggressive_ratio=0.05, mid=10000, users=100, depth=5000):
+    """
+    Synthetic order flow as a list of ('add', fields) / ('cancel', id) /
+    ('modify', fields) events. Arrivals follow a Poisson process at `rate`
+    per second (exponential gaps, used as order timestamps). Passive prices
+    cluster at the touch with a geometric fall-off away from a slowly
+    random-walking mid; a small fraction of orders cross the spread.
+    The first `depth` events are passive adds that seed the book (run
+    them with warmup=depth); after that, cancels only fire while more
+    than `depth` orders rest, so the book stays at about that depth.
+    The flow is applied to a scratch book as it is generated, so cancels
+    and modifies only target orders that are still resting.
+    """
+    rng = random.Random(seed)
+    book = OrderBook('FLOW', SymbolSpec(tick_size=1, lot_size=1))
+    flow = []
+    live = []
+    clock = 0.0
+    next_id = 0
+
+    def pick():
+        # Random resting order id, dropping ids that have since filled
+        while True:
+            i = rng.randrange(len(live))
+            live[i], live[-1] = live[-1], live[i]
+            if live[-1] in book.order_map:
+                return live[-1]
+            live.pop()
+
+    for n in range(depth + events):
+        clock += rng.expovariate(rate)
+        if rng.random() < 0.01:
+            mid += rng.choice((-1, 1))
+        seeding = n < depth
+        r = 1.0 if seeding else rng.random()
+        if r < cancel_ratio:
+            if len(book.order_map) > depth:
+                order_id = pick()
+                live.pop()
+                book.cancel_order(order_id)
+                flow.append(('cancel', order_id))
+                continue
+        elif book.order_map and r < cancel_ratio + modify_ratio:
+            fields = {'order_id': pick(), 'quantity': rng.randint(1, 10)}
+            book.amend_order(fields['order_id'], fields['quantity'])
+            flow.append(('modify', fields))
+            continue
+        side = rng.choice(('buy', 'sell'))
+        distance = min(int(rng.expovariate(0.3)), 200) + 1
+        if not seeding and rng.random() < aggressive_ratio:
+            distance = -rng.randint(1, 5)
+        price = mid - distance if side == 'buy' else mid + distance
+        order_id = f'o{next_id}'
+        next_id += 1
+        fields = {'order_id': order_id, 'side': side, 'price': price, 'quantity': rng.randint(1, 10),
+                  'user_id': f'u{rng.randrange(users)}', 'timestamp': clock}
+        book.submit_order(Order(order_id, 'FLOW', side, price, fields['quantity'], clock, fields['user_id']))
+        if order_id in book.order_map:
+            live.append(order_id)
+        flow.append(('add', fields))
+    return flow
+
+def run_book(flow, warmup=0):
+    # Applies the first `warmup` events untimed, then times the rest
+    book = OrderBook('BENCH', SymbolSpec(tick_size=1, lot_size=1))
+    latencies = {'add': [], 'cancel': [], 'modify': []}
+    clock = time.perf_counter_ns
+    for index, (op, fields) in enumerate(flow):
+        if index == warmup:
+            start = clock()
+        if op == 'add':
+            order = Order(fields['order_id'], 'BENCH', fields['side'], fields['price'],
+                          fields['quantity'], fields['timestamp'], fields['user_id'])
+            t0 = clock()
+            book.submit_order(order)
+        elif op == 'cancel':
+            t0 = clock()
+            book.cancel_order(fields)
+        else:
+            t0 = clock()
+            book.amend_order(fields['order_id'], fields['quantity'])
+        if index >= warmup:
+            latencies[op].append(clock() - t0)
+    return latencies, (clock() - start) / 1e9
+
+def run_api(flow, warmup=0):
+    from app.routes import app, order_books
+    from app.books import SYMBOL_SPECS
+    SYMBOL_SPECS['BENCH'] = SymbolSpec(tick_size=1, lot_size=1)
+    order_books.pop('BENCH', None)
+    client = app.test_client()
+    latencies = {'add': [], 'cancel': [], 'modify': []}
+    clock = time.perf_counter_ns
+    for index, (op, fields) in enumerate(flow):
+        if index == warmup:
+            start = clock()
+        if op == 'add':
+            body = dict(fields, symbol='BENCH')
+            del body['timestamp']
+            t0 = clock()
+            client.post('/order', json=body)
+        elif op == 'cancel':
+            t0 = clock()
+            client.post('/order/cancel', json={'symbol': 'BENCH', 'order_id': fields})
+        else:
+            t0 = clock()
+            client.post('/order/modify', json=dict(fields, symbol='BENCH'))
+        if index >= warmup:
+            latencies[op].append(clock() - t0)
+    return latencies, (clock() - start) / 1e9
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def summarize(latencies, elapsed):
+    result = {'ops_per_sec': sum(len(v) for v in latencies.values()) / elapsed, 'latency_us': {}}
+    for op, values in latencies.items():
+        values.sort()
+        result['latency_us'][op] = {
+            'count': len(values),
+            'p50': percentile(values, 0.50) / 1000,
+            'p99': percentile(values, 0.99) / 1000,
+            'p999': percentile(values, 0.999) / 1000,
+        }
+    return result
+
+def print_report(name, result, baseline=None):
+    line = f"{name}: {result['ops_per_sec']:,.0f} ops/s"
+    if baseline:
+        line += f" ({result['ops_per_sec'] / baseline['ops_per_sec'] - 1:+.1%} vs baseline)"
+    print(line)
+    for op, stats in result['latency_us'].items():
+        row = f"  {op:<7} n={stats['count']:<7} p50={stats['p50']:8.2f}us p99={stats['p99']:8.2f}us p999={stats['p999']:8.2f}us"
+        if baseline and op in baseline['latency_us']:
+            row += f"  p99 {stats['p99'] / baseline['latency_us'][op]['p99'] - 1:+.1%}"
+        print(row)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--api-events', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--depth', type=int, default=5000, help='resting orders to seed and hold the book at')
+    parser.add_argument('--targets', default='book,api')
+    parser.add_argument('--save', action='store_true', help=f'write results to {BASELINE}')
+    parser.add_argument('--baseline', default=BASELINE)
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    runners = {'book': (run_book, args.events), 'api': (run_api, args.api_events)}
+    results = {}
+    for target in args.targets.split(','):
+        runner, events = runners[target]
+        flow = generate_flow(events, seed=args.seed, depth=args.depth)
+        results[target] = summarize(*runner(flow, warmup=args.depth))
+        results[target]['events'] = events
+        results[target]['depth'] = args.depth
+        print_report(target, results[target], baseline.get(target))
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'baseline written to {args.baseline}')
+
+if __name__ == '__main__':
+    main()
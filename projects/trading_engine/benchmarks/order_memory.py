@@ -0,0 +1,65 @@
+"""
+Bytes per resting order, before and after the slotted Order.
+
+Run from the project root:
+    python -m benchmarks.order_memory [N]
+"""
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Optional
+from app.order_book import Order, OrderBook
+
+@dataclass
+class DictOrder:
+    # The previous Order layout: per-instance __dict__, float price, and
+    # user_id bolted on as a dynamic attribute by the API layer. Fields
+    # added to Order since are mirrored here so both carry the same data.
+    order_id: str
+    symbol: str
+    side: str
+    price: float
+    quantity: float
+    timestamp: float = field(default_factory=lambda: time.time())
+    order_type: str = 'limit'
+    stop_price: Optional[float] = None
+    stp_mode: Optional[str] = None
+    prev: Optional['DictOrder'] = field(default=None, repr=False, compare=False)
+    next: Optional['DictOrder'] = field(default=None, repr=False, compare=False)
+    level: Optional[object] = field(default=None, repr=False, compare=False)
+
+def make_dict_order(i, order_id, user_id):
+    order = DictOrder(order_id, 'BTCUSD', 'buy' if i % 2 else 'sell',
+                      100.0 + (i % 500) * 0.01 * (-1 if i % 2 else 1) + (0 if i % 2 else 10.0), 1.0)
+    order.user_id = user_id
+    return order
+
+def make_slotted_order(i, order_id, user_id):
+    return Order(order_id, 'BTCUSD', 'buy' if i % 2 else 'sell',
+                 10000 + (i % 500) * (-1 if i % 2 else 1) + (0 if i % 2 else 1000), 1,
+                 user_id=user_id)
+
+def bytes_per_order(make_order, n):
+    # Ids are created up front: they cost the same in both layouts
+    order_ids = [f'o{i}' for i in range(n)]
+    user_ids = [f'u{i % 1000}' for i in range(n)]
+    book = OrderBook('BTCUSD')
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        book.add_order(make_order(i, order_ids[i], user_ids[i]))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / n
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    before = bytes_per_order(make_dict_order, n)
+    after = bytes_per_order(make_slotted_order, n)
+    print(f'resting orders: {n}')
+    print(f'dict-backed Order: {before:8.1f} bytes/order')
+    print(f'slotted Order:     {after:8.1f} bytes/order ({after / before:.0%})')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Scaling benchmark for the sharded simulator (app.simulator).
+
+Builds synthetic flow for many symbols, each book seeded with --depth
+resting orders and held near that depth, interleaves it into one event
+stream, runs it in-process and with increasing worker counts, and checks
+every run produces the same trade log.
+
+Run from the project root:
+    python -m benchmarks.simulator_bench --symbols 2000 --events-per-symbol 200 --depth 50 --workers 1,2,4
+"""
+import argparse
+import hashlib
+import random
+import time
+from app.simulator import run
+from benchmarks.engine_bench import generate_flow
+
+def build_events(symbols, events_per_symbol, seed=1, depth=50):
+    streams = []
+    for i in range(symbols):
+        symbol = f'SYM{i}'
+        stream = []
+        for op, fields in generate_flow(events_per_symbol, seed=seed + i, depth=depth):
+            if op == 'add':
+                stream.append(('add', symbol, fields['order_id'], fields['side'], fields['price'],
+                               fields['quantity'], fields['user_id'], 'limit'))
+            elif op == 'cancel':
+                stream.append(('cancel', symbol, fields))
+            else:
+                stream.append(('modify', symbol, fields['order_id'], fields['quantity'], None))
+        streams.append(stream)
+    # Interleave symbols in a seeded random order, keeping each symbol's own order
+    rng = random.Random(seed)
+    owners = [i for i, stream in enumerate(streams) for _ in stream]
+    rng.shuffle(owners)
+    positions = [0] * symbols
+    events = []
+    for i in owners:
+        events.append(streams[i][positions[i]])
+        positions[i] += 1
+    return events
+
+def digest(trades):
+    return hashlib.sha256(repr(trades).encode()).hexdigest()[:16]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--events-per-symbol', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=50, help='resting orders per symbol')
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    events = build_events(args.symbols, args.events_per_symbol, args.seed, args.depth)
+    print(f'{len(events):,} events over {args.symbols} symbols')
+    reference = None
+    baseline = None
+    for workers in [0] + [int(w) for w in args.workers.split(',')]:
+        start = time.perf_counter()
+        trades = run(events, workers=workers)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = digest(trades)
+            baseline = elapsed
+        label = 'in-process' if workers == 0 else f'{workers} workers'
+        match = 'identical' if digest(trades) == reference else 'DIFFERENT'
+        print(f'{label:<12} {len(events) / elapsed:>12,.0f} events/s  speedup {baseline / elapsed:5.2f}x  '
+              f'{len(trades):,} trades ({match})')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Snapshot/restore timing for a large resting book.
+
+Run from the project root:
+    python -m benchmarks.snapshot_bench --orders 1000000
+"""
+import argparse
+import random
+import time
+from app.order_book import Order, OrderBook, encode_snapshot
+
+def build_book(orders, levels=2000, seed=1):
+    rng = random.Random(seed)
+    book = OrderBook('BENCH')
+    for i in range(orders):
+        side = 'buy' if i % 2 else 'sell'
+        offset = rng.randrange(1, levels // 2 + 1)
+        price = 100000 - offset if side == 'buy' else 100000 + offset
+        book.add_order(Order(f'o{i}', 'BENCH', side, price, rng.randint(1, 100), float(i), f'u{i % 500}'))
+    return book
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000000)
+    args = parser.parse_args()
+    book = build_book(args.orders)
+    start = time.perf_counter()
+    captured = book.capture()
+    capture_time = time.perf_counter() - start
+    data = encode_snapshot(captured)
+    snapshot_time = time.perf_counter() - start
+    start = time.perf_counter()
+    restored = OrderBook('BENCH').restore(data)
+    restore_time = time.perf_counter() - start
+    assert [o.order_id for o in restored.bids] == [o.order_id for o in book.bids]
+    print(f'{args.orders:,} orders, {len(data) / 1e6:.1f} MB ({len(data) / args.orders:.1f} bytes/order)')
+    print(f'snapshot {snapshot_time * 1000:8.1f} ms (book locked for the {capture_time * 1000:.1f} ms capture)')
+    print(f'restore  {restore_time * 1000:8.1f} ms')
+
+if __name__ == '__main__':
+    main()
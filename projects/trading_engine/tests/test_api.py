@@ -1,6 +1,6 @@
 import unittest
 import json
-from app.routes import app, order_books
+from app.routes import app, order_books, pnl_tracker, risk_engine
 from app.order_book import OrderBook
 
 class TestAPI(unittest.TestCase):
@@ -8,6 +8,8 @@ class TestAPI(unittest.TestCase):
         self.client = app.test_client()
         # Clear order_books for a clean test
         order_books.clear()
+        pnl_tracker.clear()
+        risk_engine.reset()
 
     def test_add_and_depth_multi_symbol(self):
         # Add order for BTCUSD
@@ -30,28 +32,137 @@ class TestAPI(unittest.TestCase):
         data = resp.get_json()
         self.assertEqual(data['bids'], [])
         self.assertEqual(data['asks'], [[200.0, 2.0]])
+        self.assertEqual(self.client.get('/depth?symbol=ETHUSD&levels=1').get_json()['asks'], [[200.0, 2.0]])
+        self.assertEqual(self.client.get('/depth?symbol=ETHUSD&levels=-1').status_code, 400)
 
     def test_match_and_pnl_multi_symbol(self):
         # Add buy and sell for BTCUSD
         self.client.post('/order', json={
             'order_id': '1', 'symbol': 'BTCUSD', 'side': 'buy', 'price': 101, 'quantity': 2, 'user_id': 'A'
         })
-        self.client.post('/order', json={
+        resp = self.client.post('/order', json={
             'order_id': '2', 'symbol': 'BTCUSD', 'side': 'sell', 'price': 100, 'quantity': 2, 'user_id': 'B'
         })
-        # Match BTCUSD
-        resp = self.client.post('/match', json={'symbol': 'BTCUSD'})
+        # The crossing sell fills on entry at the resting buy's price
         trades = resp.get_json()['trades']
         self.assertEqual(len(trades), 1)
+        self.assertEqual(trades[0]['price'], 101)
+        # Nothing is left crossed for /match
+        resp = self.client.post('/match', json={'symbol': 'BTCUSD'})
+        self.assertEqual(resp.get_json()['trades'], [])
         # Check PnL for A and B
         resp = self.client.get('/pnl?symbol=BTCUSD&user_id=A')
         pnlA = resp.get_json()
         self.assertEqual(pnlA['positions']['BTCUSD'], 2)
-        self.assertEqual(pnlA['realized'], -200)
+        self.assertEqual(pnlA['realized'], 0)
+        self.assertEqual(pnlA['avg_prices']['BTCUSD'], 101)
         resp = self.client.get('/pnl?symbol=BTCUSD&user_id=B')
         pnlB = resp.get_json()
         self.assertEqual(pnlB['positions']['BTCUSD'], -2)
-        self.assertEqual(pnlB['realized'], 200)
+        self.assertEqual(pnlB['realized'], 0)
+        # Marked to the book mid instead of the 101 trade price
+        self.client.post('/order', json={
+            'order_id': '3', 'symbol': 'BTCUSD', 'side': 'buy', 'price': 102, 'quantity': 1, 'user_id': 'C'
+        })
+        self.client.post('/order', json={
+            'order_id': '4', 'symbol': 'BTCUSD', 'side': 'sell', 'price': 106, 'quantity': 1, 'user_id': 'C'
+        })
+        resp = self.client.get('/pnl?symbol=BTCUSD&user_id=A&mark=mid')
+        self.assertEqual(resp.get_json()['unrealized'], 6)
+
+    def test_batch_orders(self):
+        resp = self.client.post('/orders/batch', json={'operations': [
+            {'op': 'add', 'order_id': 'a1', 'symbol': 'BTCUSD', 'side': 'sell', 'price': 101, 'quantity': 1},
+            {'op': 'add', 'order_id': 'e1', 'symbol': 'ETHUSD', 'side': 'buy', 'price': 20, 'quantity': 3},
+            {'op': 'add', 'order_id': 'a2', 'symbol': 'BTCUSD', 'side': 'sell', 'price': 102, 'quantity': 1},
+            {'op': 'modify', 'order_id': 'a2', 'symbol': 'BTCUSD', 'quantity': 1, 'price': 103},
+            {'op': 'add', 'order_id': 'b1', 'symbol': 'BTCUSD', 'side': 'buy', 'price': 101, 'quantity': 1},
+            {'op': 'cancel', 'order_id': 'e1', 'symbol': 'ETHUSD'},
+            {'op': 'cancel', 'order_id': 'zz', 'symbol': 'XRPUSD'},
+            {'op': 'add', 'order_id': 'bad', 'symbol': 'BTCUSD', 'side': 'buy'},
+        ]})
+        data = resp.get_json()
+        statuses = [r['status'] for r in data['results']]
+        self.assertEqual(statuses, ['ok', 'ok', 'ok', 'ok', 'ok', 'ok', 'not found', 'error'])
+        self.assertEqual(len(data['trades']), 1)
+        self.assertEqual(data['results'][4]['trades'][0]['sell_order_id'], 'a1')
+        depth = self.client.get('/depth?symbol=BTCUSD').get_json()
+        self.assertEqual(depth['asks'], [[103.0, 1.0]])
+        self.assertNotIn('XRPUSD', order_books)
+
+    def test_fractional_fills_are_exact(self):
+        self.client.post('/order', json={
+            'order_id': 's1', 'symbol': 'ETHUSD', 'side': 'sell', 'price': 0.3, 'quantity': 0.3
+        })
+        for i in range(3):
+            resp = self.client.post('/order', json={
+                'order_id': f'b{i}', 'symbol': 'ETHUSD', 'side': 'buy', 'price': 0.3, 'quantity': 0.1
+            })
+            self.assertEqual(resp.get_json()['trades'][0]['quantity'], 0.1)
+        # 0.3 - 0.1 - 0.1 - 0.1 leaves nothing behind
+        self.assertEqual(order_books['ETHUSD'].order_map, {})
+        self.assertEqual(self.client.get('/depth?symbol=ETHUSD').get_json(), {'bids': [], 'asks': []})
+
+    def test_off_tick_price_rejected(self):
+        resp = self.client.post('/order', json={
+            'order_id': '1', 'symbol': 'BTCUSD', 'side': 'buy', 'price': 100.001, 'quantity': 1
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.get_json()['status'], 'error')
+
+    def test_non_finite_price_rejected(self):
+        for price in (float('inf'), float('nan')):
+            resp = self.client.post('/order', data=json.dumps({
+                'order_id': '1', 'symbol': 'BTCUSD', 'side': 'buy', 'price': price, 'quantity': 1
+            }), content_type='application/json')
+            self.assertEqual(resp.status_code, 400)
+
+    def test_non_positive_quantity_rejected(self):
+        resp = self.client.post('/order', json={
+            'order_id': '1', 'symbol': 'BTCUSD', 'side': 'sell', 'price': 100, 'quantity': 0
+        })
+        self.assertEqual(resp.status_code, 400)
+        self.client.post('/order', json={
+            'order_id': 'a', 'symbol': 'BTCUSD', 'side': 'sell', 'price': 100, 'quantity': 1, 'user_id': 'A'
+        })
+        resp = self.client.post('/order/modify', json={'order_id': 'a', 'symbol': 'BTCUSD', 'quantity': 0})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post('/order/modify', json={'order_id': 'a', 'symbol': 'BTCUSD', 'quantity': 1,
+                                                       'price': -5})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.client.get('/depth?symbol=BTCUSD').get_json()['asks'], [[100.0, 1.0]])
+
+    def test_ids_are_strings(self):
+        resp = self.client.post('/order', json={
+            'order_id': 7, 'symbol': 'BTCUSD', 'side': 'sell', 'price': 100, 'quantity': 1, 'user_id': 42
+        })
+        self.assertEqual(resp.get_json()['status'], 'ok')
+        self.assertEqual(order_books['BTCUSD'].order_map['7'].user_id, '42')
+        for bad in ({'order_id': ['x']}, {'order_id': 'x' * 17}, {'user_id': 'x' * 70000}, {'order_id': 'a\0b'}, {'user_id': {}}):
+            resp = self.client.post('/order', json=dict(
+                {'order_id': '8', 'symbol': 'BTCUSD', 'side': 'sell', 'price': 100, 'quantity': 1}, **bad))
+            self.assertEqual(resp.status_code, 400)
+        resp = self.client.post('/order/cancel', json={'order_id': 7, 'symbol': 'BTCUSD'})
+        self.assertEqual(resp.get_json()['status'], 'ok')
+
+    def test_portfolio_pnl_across_symbols(self):
+        for symbol, price in (('BTCUSD', 100), ('ETHUSD', 10)):
+            self.client.post('/order', json={
+                'order_id': f'{symbol}-s', 'symbol': symbol, 'side': 'sell', 'price': price, 'quantity': 2, 'user_id': 'mm'
+            })
+            self.client.post('/order', json={
+                'order_id': f'{symbol}-b', 'symbol': symbol, 'side': 'buy', 'price': price, 'quantity': 2, 'user_id': 'X'
+            })
+        pnl = self.client.get('/pnl?user_id=X').get_json()
+        self.assertEqual(pnl['positions'], {'BTCUSD': 2, 'ETHUSD': 2})
+        self.assertEqual(pnl['exposure'], 220)
+        pnl = self.client.get('/pnl?user_id=X&symbol=ETHUSD').get_json()
+        self.assertEqual(pnl['positions'], {'ETHUSD': 2})
+        resp = self.client.post('/pnl/bulk', json={'user_ids': ['X', 'mm', 'nobody']})
+        bulk = resp.get_json()['pnl']
+        self.assertEqual(bulk['mm']['positions'], {'BTCUSD': -2, 'ETHUSD': -2})
+        self.assertEqual(bulk['nobody']['positions'], {})
+        self.assertEqual(sorted(self.client.post('/pnl/bulk', json={}).get_json()['pnl']), ['X', 'mm'])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import threading
+from app.routes import app, order_books, risk_engine
+from app.books import get_book
+
+class TestConcurrency(unittest.TestCase):
+    def setUp(self):
+        order_books.clear()
+        risk_engine.reset()
+
+    def _run_threads(self, target, count):
+        barrier = threading.Barrier(count)
+        def run(i):
+            barrier.wait()
+            target(i)
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def test_lazy_book_creation_is_shared(self):
+        books = []
+        self._run_threads(lambda i: books.append(get_book('SOLUSD', create=True)), 16)
+        self.assertEqual(len({id(b) for b in books}), 1)
+        self.assertIs(order_books['SOLUSD'], books[0])
+
+    def test_parallel_order_entry(self):
+        symbols = ['BTCUSD', 'ETHUSD']
+        def submit(i):
+            client = app.test_client()
+            symbol = symbols[i % 2]
+            for n in range(50):
+                side = 'buy' if (i + n) % 2 else 'sell'
+                client.post('/order', json={
+                    'order_id': f'{i}-{n}', 'symbol': symbol, 'side': side, 'price': 100, 'quantity': 1
+                })
+        self._run_threads(submit, 8)
+        for symbol in symbols:
+            book = order_books[symbol]
+            # Equal buy and sell flow at one price must fully cross
+            self.assertEqual(len(book.bids) + len(book.asks), 0)
+            self.assertEqual(book.order_map, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import json
+from app.order_book import Order, OrderBook
+from app.feed import MarketDataFeed
+from app.routes import app, order_books, risk_engine
+
+class TestMarketDataFeed(unittest.TestCase):
+    def setUp(self):
+        self.book = OrderBook(symbol='BTCUSD')
+        self.feed = MarketDataFeed(self.book, history=5, max_pending=3)
+
+    def test_deltas_and_trades_are_sequenced(self):
+        sub, catch_up = self.feed.subscribe()
+        self.assertEqual(catch_up[0]['type'], 'snapshot')
+        self.book.submit_order(Order(order_id='s1', symbol='BTCUSD', side='sell', price=100, quantity=2))
+        self.book.submit_order(Order(order_id='b1', symbol='BTCUSD', side='buy', price=100, quantity=1))
+        messages = sub.get(0) + sub.get(0) + sub.get(0)
+        self.assertEqual([m['seq'] for m in messages], [1, 2, 3])
+        self.assertEqual(messages[0], {'seq': 1, 'symbol': 'BTCUSD', 'type': 'depth', 'side': 'asks', 'price': 100, 'quantity': 2})
+        self.assertEqual(messages[1]['quantity'], 1)
+        self.assertEqual(messages[2]['type'], 'trade')
+        self.assertEqual(messages[2]['buy_order_id'], 'b1')
+        self.assertEqual(sub.get(0), [])
+
+    def test_slow_consumer_replays_after_overflow(self):
+        sub, _ = self.feed.subscribe()
+        for i in range(4):
+            self.book.add_order(Order(order_id=str(i), symbol='BTCUSD', side='buy', price=90 + i, quantity=1))
+        # Queue held 3 messages; the 4th overflowed, so the read replays from history
+        self.assertEqual([m['seq'] for m in sub.get(0)], [1, 2, 3, 4])
+        self.book.cancel_order('0')
+        self.assertEqual([m['seq'] for m in sub.get(0)], [5])
+
+    def test_reconnect_behind_history_gets_snapshot(self):
+        for i in range(8):
+            self.book.add_order(Order(order_id=str(i), symbol='BTCUSD', side='sell', price=100 + i, quantity=1))
+        _, catch_up = self.feed.subscribe(last_seq=6)
+        self.assertEqual([m['seq'] for m in catch_up], [7, 8])
+        _, catch_up = self.feed.subscribe(last_seq=1)
+        self.assertEqual(len(catch_up), 1)
+        self.assertEqual(catch_up[0]['type'], 'snapshot')
+        self.assertEqual(catch_up[0]['seq'], 8)
+        self.assertEqual(len(catch_up[0]['asks']), 8)
+
+    def test_sse_endpoint(self):
+        order_books.clear()
+        risk_engine.reset()
+        client = app.test_client()
+        client.post('/order', json={'order_id': '1', 'symbol': 'ETHUSD', 'side': 'buy', 'price': 10, 'quantity': 1})
+        resp = client.get('/stream?symbol=ETHUSD&since=0')
+        self.assertEqual(resp.mimetype, 'text/event-stream')
+        chunk = next(resp.response).decode()
+        resp.close()
+        self.assertTrue(chunk.startswith('id: 1\nevent: depth\n'))
+        data = json.loads(chunk.split('data: ', 1)[1])
+        self.assertEqual((data['side'], data['price'], data['quantity']), ('bids', 10.0, 1.0))
+        self.assertEqual(client.get('/stream?symbol=ETHUSD&since=abc').status_code, 400)
+        self.assertEqual(client.get('/stream', headers={'Last-Event-ID': 'x'}).status_code, 400)
+        self.assertEqual(client.get('/stream?symbol=NOBOOK').status_code, 404)
+        self.assertNotIn('NOBOOK', order_books)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import unittest
+from app.books import order_books, pnl_tracker, risk_engine, get_book
+from app.gateway import (handle_connection, pack_new, pack_cancel, pack_modify, read_response, NEW,
+                         STATUS_OK, STATUS_NOT_FOUND, STATUS_REJECTED, STATUS_ERROR)
+
+class TestGateway(unittest.TestCase):
+    def setUp(self):
+        order_books.pop('GWTEST', None)
+        pnl_tracker.clear()
+        risk_engine.reset()
+
+    def exchange(self, messages, chunk_size=None):
+        # Pipelines every message (in one write, or in chunk_size pieces that
+        # split messages), then reads one response per message
+        async def run():
+            server = await asyncio.start_server(handle_connection, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            payload = b''.join(messages)
+            step = chunk_size or len(payload)
+            for start in range(0, len(payload), step):
+                writer.write(payload[start:start + step])
+                await writer.drain()
+                await asyncio.sleep(0)
+            responses = [await read_response(reader) for _ in messages]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return responses
+        return asyncio.run(run())
+
+    def test_pipelined_orders(self):
+        responses = self.exchange([
+            pack_new('s1', 'GWTEST', 'sell', 10100, 300, user_id='alice'),
+            pack_new('s2', 'GWTEST', 'sell', 10200, 200, user_id='alice'),
+            pack_new('b1', 'GWTEST', 'buy', 10200, 400, user_id='bob'),
+            pack_modify('s2', 'GWTEST', 50),
+            pack_cancel('s1', 'GWTEST'),
+            pack_cancel('s2', 'GWTEST'),
+        ])
+        self.assertEqual([r[:3] for r in responses[:3]], [
+            (STATUS_OK, 'resting', 's1'), (STATUS_OK, 'resting', 's2'), (STATUS_OK, 'filled', 'b1')])
+        self.assertEqual(responses[2][4], [('b1', 's1', 10100, 300), ('b1', 's2', 10200, 100)])
+        self.assertEqual(responses[3][0], STATUS_OK)
+        self.assertEqual(responses[4][0], STATUS_NOT_FOUND)
+        self.assertEqual(responses[5][0], STATUS_OK)
+        # The gateway drives the same books and PnL store as the REST API
+        self.assertEqual(order_books['GWTEST'].get_l2_depth(), {'bids': [], 'asks': []})
+        self.assertEqual(pnl_tracker.position('bob', 'GWTEST'), 4.0)
+
+    def test_rejects(self):
+        responses = self.exchange([
+            pack_new('s1', 'GWTEST', 'sell', 10100, 100),
+            pack_new('b1', 'GWTEST', 'buy', 10100, 100, order_type='post_only'),
+            pack_modify('missing', 'NOBOOK', 100),
+            pack_new('b2', 'GWTEST', 'buy', 10100, 0),
+            pack_modify('s1', 'GWTEST', 0),
+            pack_new('b3', 'GWTEST', 'buy', 10000, 100, order_type='post_only'),
+            pack_modify('b3', 'GWTEST', 100, 10100),
+            pack_modify('b3', 'GWTEST', 200000000),
+        ])
+        self.assertEqual(responses[1][0], STATUS_REJECTED)
+        self.assertTrue(responses[1][3])
+        self.assertEqual(responses[2][0], STATUS_NOT_FOUND)
+        self.assertEqual([r[0] for r in responses[3:]],
+                         [STATUS_REJECTED, STATUS_REJECTED, STATUS_OK, STATUS_REJECTED, STATUS_REJECTED])
+        self.assertIn('quantity', responses[-1][3])
+        self.assertEqual(order_books['GWTEST'].get_l2_depth(),
+                         {'bids': [(10000, 100)], 'asks': [(10100, 100)]})
+
+    def test_split_messages(self):
+        responses = self.exchange([pack_new(f'b{i}', 'GWTEST', 'buy', 10000 - i, 100) for i in range(5)],
+                                  chunk_size=7)
+        self.assertEqual([r[:3] for r in responses], [(STATUS_OK, 'resting', f'b{i}') for i in range(5)])
+
+    def test_bad_utf8_is_an_error(self):
+        bad = NEW.pack(b'N', 0, 0, 0, 0, b'\xff\xfe', b'GWTEST', b'', 10000, 100, 0)
+        responses = self.exchange([bad, pack_new('b1', 'GWTEST', 'buy', 10000, 100)])
+        self.assertEqual(responses[0][0], STATUS_ERROR)
+        self.assertEqual(responses[1][:3], (STATUS_OK, 'resting', 'b1'))
+
+    def test_held_book_lock_does_not_stall_other_connections(self):
+        locked = get_book('GWLOCK', create=True)
+
+        async def run():
+            server = await asyncio.start_server(handle_connection, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            slow_reader, slow_writer = await asyncio.open_connection('127.0.0.1', port)
+            fast_reader, fast_writer = await asyncio.open_connection('127.0.0.1', port)
+            slow_writer.write(pack_new('s1', 'GWLOCK', 'buy', 10000, 100))
+            await asyncio.sleep(0.05)
+            fast_writer.write(pack_new('b1', 'GWTEST', 'buy', 10000, 100))
+            fast = await read_response(fast_reader)
+            answered_while_locked = not release.finished.is_set()
+            release.cancel()
+            if answered_while_locked:
+                locked.lock.release()
+            slow = await read_response(slow_reader)
+            for writer in (slow_writer, fast_writer):
+                writer.close()
+            server.close()
+            await server.wait_closed()
+            return fast, slow, answered_while_locked
+
+        # Stands in for a REST thread or checkpoint holding the lock; the
+        # timer only lets a stalled loop finish the test
+        locked.lock.acquire()
+        release = threading.Timer(2.0, locked.lock.release)
+        release.start()
+        try:
+            fast, slow, answered_while_locked = asyncio.run(run())
+        finally:
+            order_books.pop('GWLOCK', None)
+        self.assertTrue(answered_while_locked)
+        self.assertEqual(fast[:3], (STATUS_OK, 'resting', 'b1'))
+        self.assertEqual(slow[:3], (STATUS_OK, 'resting', 's1'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import os
+import tempfile
+import time
+from app.order_book import Order, OrderBook
+from app.pnl import PnLTracker
+from app.journal import Journal, recover, replay
+
+def make_order(order_id, side, price, quantity, user_id=None):
+    return Order(order_id=order_id, symbol='BTCUSD', side=side, price=price, quantity=quantity, user_id=user_id)
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _state(self, book):
+        return ([(o.order_id, o.price, o.quantity, o.timestamp) for o in book.bids],
+                [(o.order_id, o.price, o.quantity, o.timestamp) for o in book.asks],
+                book.pnl_tracker.user_pnl)
+
+    def _drive(self, book):
+        book.submit_order(make_order('b1', 'buy', 100, 2, 'A'))
+        book.submit_order(make_order('b2', 'buy', 99, 2, 'A'))
+        book.submit_order(make_order('s1', 'sell', 101, 3, 'B'))
+        book.add_order(make_order('s2', 'sell', 100, 1, 'B'))
+        book.match_orders()
+        book.modify_order('b2', 1)
+        book.modify_order('s1', 3, 100)
+        book.cancel_order('nope')
+        book.submit_order(make_order('b3', 'buy', 98, 4))
+        book.cancel_order('b3')
+        stop = make_order('st', 'sell', 90, 1, 'A')
+        stop.stop_price = 95
+        stop.stp_mode = 'cancel_oldest'
+        book.submit_order(stop)
+
+    def test_replay_rebuilds_book(self):
+        books, journal = recover(self.dir)
+        book = books['BTCUSD'] = OrderBook('BTCUSD')
+        book.journal = journal
+        self._drive(book)
+        journal.close()
+        recovered, journal = recover(self.dir)
+        journal.close()
+        # Amended orders keep the timestamp they were given, not the replay time
+        self.assertEqual(self._state(recovered['BTCUSD']), self._state(book))
+
+    def test_checkpoint_then_tail(self):
+        books, journal = recover(self.dir)
+        book = books['BTCUSD'] = OrderBook('BTCUSD')
+        book.journal = journal
+        self._drive(book)
+        journal.checkpoint(books)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['journal-1.bin', 'snapshot.bin'])
+        book.submit_order(make_order('s9', 'sell', 99, 1, 'C'))
+        journal.close()
+        recovered, journal = recover(self.dir)
+        journal.close()
+        self.assertEqual(self._state(recovered['BTCUSD']), self._state(book))
+        self.assertEqual(recovered['BTCUSD'].stop_map['st'].stop_price, 95)
+        self.assertEqual(recovered['BTCUSD'].stop_map['st'].stp_mode, 'cancel_oldest')
+
+    def test_interrupted_checkpoint_replays_every_generation(self):
+        books, journal = recover(self.dir)
+        book = books['BTCUSD'] = OrderBook('BTCUSD')
+        book.journal = journal
+        self._drive(book)
+        journal.begin_checkpoint(books)  # Crash before the snapshot is written
+        book.submit_order(make_order('s9', 'sell', 99, 1, 'C'))
+        journal.close()
+        self.assertEqual(sorted(os.listdir(self.dir)), ['journal-0.bin', 'journal-1.bin'])
+        recovered, journal = recover(self.dir)
+        journal.close()
+        self.assertEqual(self._state(recovered['BTCUSD']), self._state(book))
+
+    def test_shared_pnl_tracker_snapshot(self):
+        tracker = PnLTracker()
+        books, journal = recover(self.dir, lambda symbol: OrderBook(symbol, pnl_tracker=tracker))
+        for symbol in ('BTCUSD', 'ETHUSD'):
+            book = books[symbol] = OrderBook(symbol, pnl_tracker=tracker)
+            book.journal = journal
+            book.submit_order(Order('s', symbol, 'sell', 10, 1, user_id='A'))
+            book.submit_order(Order('b', symbol, 'buy', 10, 1, user_id='B'))
+        journal.checkpoint(books)
+        journal.close()
+        restored = PnLTracker()
+        recover(self.dir, lambda symbol: OrderBook(symbol, pnl_tracker=restored))[1].close()
+        self.assertEqual(restored.get_pnl('B'), tracker.get_pnl('B'))
+        self.assertEqual(restored.get_pnl('B')['positions'], {'BTCUSD': 1, 'ETHUSD': 1})
+
+    def test_torn_tail_is_ignored(self):
+        journal = Journal(self.dir)
+        book = OrderBook('BTCUSD')
+        book.journal = journal
+        book.submit_order(make_order('b1', 'buy', 100, 1))
+        journal.close()
+        path = os.path.join(self.dir, 'journal-0.bin')
+        size = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00\x02partial')
+        recovered, journal = recover(self.dir)
+        book = recovered['BTCUSD']
+        book.submit_order(make_order('b2', 'buy', 100, 1))
+        journal.close()
+        self.assertGreater(os.path.getsize(path), size)
+        books = {}
+        self.assertEqual(replay(path, books, OrderBook), os.path.getsize(path))
+        self.assertEqual([o.order_id for o in books['BTCUSD'].bids], ['b1', 'b2'])
+
+    def test_replay_many_records(self):
+        journal = Journal(self.dir, sync_every=100000, sync_interval=60)
+        book = OrderBook('BTCUSD')
+        book.journal = journal
+        for i in range(20000):
+            book.add_order(make_order(str(i), 'buy' if i % 2 else 'sell', 1000 + (i % 50) * (1 if i % 2 else -1), 1))
+        journal.close()
+        books = {}
+        replay(os.path.join(self.dir, 'journal-0.bin'), books, OrderBook)
+        self.assertEqual(len(books['BTCUSD'].order_map), 20000)
+
+    def test_idle_records_are_synced(self):
+        journal = Journal(self.dir, sync_interval=0.01)
+        book = OrderBook('BTCUSD')
+        book.journal = journal
+        for i in range(5):
+            book.submit_order(make_order(str(i), 'buy', 100 - i, 1))
+        # No further appends: the background flusher must write the tail
+        path = os.path.join(self.dir, 'journal-0.bin')
+
+        def on_disk():
+            books = {}
+            replay(path, books, OrderBook)
+            return len(books['BTCUSD'].order_map) if books else 0
+
+        deadline = time.monotonic() + 5
+        while on_disk() < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        count = on_disk()
+        journal.close()
+        self.assertEqual(count, 5)
+
+if __name__ == '__main__':
+    unittest.main()
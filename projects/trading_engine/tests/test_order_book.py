@@ -1,5 +1,5 @@
 import unittest
-from app.order_book import Order, OrderBook
+from app.order_book import Order, OrderBook, OrderRejected, SymbolSpec
 import time
 
 class TestOrderBook(unittest.TestCase):
@@ -23,6 +23,31 @@ class TestOrderBook(unittest.TestCase):
         self.assertEqual(self.book.bids[0].quantity, 5)
         self.assertEqual(self.book.bids[0].price, 105)
 
+    def test_non_positive_quantity_rejected(self):
+        self.book.add_order(Order(order_id='1', symbol='BTCUSD', side='sell', price=100, quantity=1))
+        with self.assertRaises(OrderRejected):
+            self.book.amend_order('1', 0)
+        with self.assertRaises(OrderRejected):
+            self.book.submit_order(Order(order_id='2', symbol='BTCUSD', side='buy', price=100, quantity=0))
+        self.assertEqual(self.book.get_l2_depth()['asks'], [(100, 1)])
+
+    def test_duplicate_order_id_rejected(self):
+        self.book.submit_order(Order(order_id='x', symbol='BTCUSD', side='sell', price=100, quantity=1))
+        with self.assertRaises(OrderRejected):
+            self.book.submit_order(Order(order_id='x', symbol='BTCUSD', side='sell', price=101, quantity=1))
+        with self.assertRaises(OrderRejected):
+            self.book.add_order(Order(order_id='x', symbol='BTCUSD', side='sell', price=101, quantity=1))
+        self.assertTrue(self.book.cancel_order('x'))
+        self.assertEqual(self.book.get_l2_depth()['asks'], [])
+
+    def test_unknown_side_rejected(self):
+        with self.assertRaises(OrderRejected):
+            self.book.submit_order(Order(order_id='1', symbol='BTCUSD', side='BUY', price=100, quantity=1))
+        with self.assertRaises(OrderRejected):
+            self.book.add_order(Order(order_id='2', symbol='BTCUSD', side='bid', price=100, quantity=1))
+        self.assertEqual(self.book.get_l2_depth(), {'bids': [], 'asks': []})
+        self.book.snapshot()
+
     def test_cancel_order(self):
         order = Order(order_id='1', symbol='BTCUSD', side='buy', price=100, quantity=1)
         self.book.add_order(order)
@@ -38,5 +63,80 @@ class TestOrderBook(unittest.TestCase):
         self.assertEqual(depth['bids'], [(100, 3)])
         self.assertEqual(depth['asks'], [(101, 3)])
 
+    def test_l2_depth_incremental(self):
+        for i, price in enumerate([100, 99, 98, 100]):
+            self.book.add_order(Order(order_id=f'b{i}', symbol='BTCUSD', side='buy', price=price, quantity=4))
+        self.book.add_order(Order(order_id='s0', symbol='BTCUSD', side='sell', price=101, quantity=4))
+        self.assertEqual(self.book.get_l2_depth(levels=2)['bids'], [(100, 8), (99, 4)])
+        self.book.modify_order('b1', new_quantity=3)
+        self.book.cancel_order('b3')
+        self.book.submit_order(Order(order_id='s1', symbol='BTCUSD', side='sell', price=99, quantity=5))
+        depth = self.book.get_l2_depth()
+        self.assertEqual(depth['bids'], [(99, 2), (98, 4)])
+        self.assertEqual(depth['asks'], [(101, 4)])
+        self.assertEqual(self.book.get_l2_depth(levels=1)['bids'], [(99, 2)])
+
+    def test_price_time_priority(self):
+        self.book.add_order(Order(order_id='1', symbol='BTCUSD', side='buy', price=100, quantity=1))
+        self.book.add_order(Order(order_id='2', symbol='BTCUSD', side='buy', price=102, quantity=1))
+        self.book.add_order(Order(order_id='3', symbol='BTCUSD', side='buy', price=100, quantity=1))
+        self.book.add_order(Order(order_id='4', symbol='BTCUSD', side='sell', price=105, quantity=1))
+        self.book.add_order(Order(order_id='5', symbol='BTCUSD', side='sell', price=103, quantity=1))
+        self.assertEqual([o.order_id for o in self.book.bids], ['2', '1', '3'])
+        self.assertEqual([o.order_id for o in self.book.asks], ['5', '4'])
+        self.book.cancel_order('2')
+        self.assertEqual(self.book.bids.best_price(), 100)
+        self.assertEqual(self.book.asks.best_price(), 103)
+
+    def test_modify_queue_priority(self):
+        for oid in ('1', '2', '3'):
+            self.book.add_order(Order(order_id=oid, symbol='BTCUSD', side='sell', price=101, quantity=5))
+        self.book.cancel_order('2')
+        self.assertEqual([o.order_id for o in self.book.asks], ['1', '3'])
+        # Reducing size keeps the order at the front of its level
+        self.book.modify_order('1', new_quantity=2)
+        self.assertEqual([o.order_id for o in self.book.asks], ['1', '3'])
+        # Increasing size or changing price sends it to the back
+        self.book.modify_order('1', new_quantity=6)
+        self.assertEqual([o.order_id for o in self.book.asks], ['3', '1'])
+        self.book.modify_order('3', new_quantity=5, new_price=102)
+        self.assertEqual([o.order_id for o in self.book.asks], ['1', '3'])
+        self.assertEqual(len(self.book.asks.levels), 2)
+
+    def test_symbol_spec_conversions(self):
+        spec = SymbolSpec(tick_size=0.01, lot_size=0.001)
+        self.assertEqual(spec.to_ticks(100.07), 10007)
+        self.assertEqual(spec.to_lots(0.3), 300)
+        self.assertEqual(spec.to_price(10007), 100.07)
+        self.assertEqual(spec.to_quantity(300), 0.3)
+        with self.assertRaises(ValueError):
+            spec.to_ticks(100.005)
+        with self.assertRaises(ValueError):
+            spec.to_lots(0.0005)
+
+    def test_snapshot_restore(self):
+        for i, (side, price) in enumerate([('buy', 99), ('buy', 100), ('sell', 102), ('buy', 99), ('sell', 101)]):
+            self.book.add_order(Order(order_id=str(i), symbol='BTCUSD', side=side, price=price, quantity=i + 1,
+                                      timestamp=float(i), user_id='u1' if i % 2 else None,
+                                      stp_mode='cancel_oldest' if i == 3 else None))
+        self.book.submit_order(Order(order_id='stop', symbol='BTCUSD', side='buy', price=103, quantity=1,
+                                     order_type='ioc', stop_price=102))
+        self.book.submit_order(Order(order_id='t', symbol='BTCUSD', side='buy', price=101, quantity=1))
+        restored = OrderBook('BTCUSD').restore(self.book.snapshot())
+        self.assertEqual(restored.get_l2_depth(), self.book.get_l2_depth())
+        self.assertEqual(list(restored.bids), list(self.book.bids))
+        self.assertEqual(list(restored.asks), list(self.book.asks))
+        self.assertEqual(restored.order_map, self.book.order_map)
+        self.assertEqual(restored.stop_map, self.book.stop_map)
+        self.assertEqual(restored.last_trade_price, 101)
+        self.assertEqual(restored.bids.best_level().tail.order_id, '1')
+        # The restored book keeps trading in the original priority order
+        trades = restored.submit_order(Order(order_id='s', symbol='BTCUSD', side='sell', price=99, quantity=6))
+        self.assertEqual([t['buy_order_id'] for t in trades], ['1', '0', '3'])
+        self.assertEqual(OrderBook('BTCUSD').restore(OrderBook('BTCUSD').snapshot()).get_l2_depth(),
+                         {'bids': [], 'asks': []})
+        with self.assertRaises(ValueError):
+            OrderBook('ETHUSD').restore(self.book.snapshot())
+
 if __name__ == '__main__':
     unittest.main()
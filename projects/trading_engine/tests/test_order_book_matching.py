@@ -39,5 +39,26 @@ class TestOrderBookMatching(unittest.TestCase):
         self.assertEqual(self.book.bids[0].quantity, 1)
         self.assertEqual(len(self.book.asks), 0)
 
+    def test_submit_order_matches_on_entry(self):
+        self.book.submit_order(Order(order_id='s1', symbol='BTCUSD', side='sell', price=100, quantity=1))
+        self.book.submit_order(Order(order_id='s2', symbol='BTCUSD', side='sell', price=101, quantity=1))
+        trades = self.book.submit_order(Order(order_id='b1', symbol='BTCUSD', side='buy', price=101, quantity=3))
+        # Walks both ask levels at the resting prices, remainder rests
+        self.assertEqual([(t['sell_order_id'], t['price']) for t in trades], [('s1', 100), ('s2', 101)])
+        self.assertEqual(len(self.book.asks), 0)
+        self.assertEqual(self.book.bids[0].order_id, 'b1')
+        self.assertEqual(self.book.bids[0].quantity, 1)
+        self.assertEqual(self.book.match_orders(), [])
+
+    def test_amend_order_crossing_trades(self):
+        self.book.submit_order(Order(order_id='b1', symbol='BTCUSD', side='buy', price=99, quantity=1))
+        self.book.submit_order(Order(order_id='s1', symbol='BTCUSD', side='sell', price=101, quantity=1))
+        trades = self.book.amend_order('s1', 1, 98)
+        self.assertEqual(len(trades), 1)
+        self.assertEqual(trades[0]['price'], 99)
+        self.assertEqual(len(self.book.bids), 0)
+        self.assertEqual(len(self.book.asks), 0)
+        self.assertIsNone(self.book.amend_order('missing', 1))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+from app.order_book import Order, OrderBook, OrderRejected
+from app.routes import app, order_books, risk_engine
+
+def order(order_id, side, price, quantity, order_type='limit', stop_price=None):
+    return Order(order_id=order_id, symbol='BTCUSD', side=side, price=price, quantity=quantity,
+                 order_type=order_type, stop_price=stop_price)
+
+class TestOrderTypes(unittest.TestCase):
+    def setUp(self):
+        self.book = OrderBook(symbol='BTCUSD')
+        self.book.submit_order(order('s1', 'sell', 101, 2))
+        self.book.submit_order(order('s2', 'sell', 102, 2))
+
+    def test_ioc_never_rests(self):
+        trades = self.book.submit_order(order('b1', 'buy', 101, 5, 'ioc'))
+        self.assertEqual(sum(t['quantity'] for t in trades), 2)
+        self.assertNotIn('b1', self.book.order_map)
+        self.assertEqual(self.book.submit_order(order('b2', 'buy', 100, 1, 'ioc')), [])
+        self.assertEqual(len(self.book.bids), 0)
+
+    def test_fok_all_or_nothing(self):
+        self.assertEqual(self.book.submit_order(order('b1', 'buy', 102, 5, 'fok')), [])
+        self.assertEqual(self.book.get_l2_depth()['asks'], [(101, 2), (102, 2)])
+        self.assertEqual(len(self.book.bids), 0)
+        trades = self.book.submit_order(order('b2', 'buy', 102, 3, 'fok'))
+        self.assertEqual([(t['price'], t['quantity']) for t in trades], [(101, 2), (102, 1)])
+
+    def test_post_only(self):
+        with self.assertRaises(OrderRejected):
+            self.book.submit_order(order('b1', 'buy', 101, 1, 'post_only'))
+        self.assertEqual(len(self.book.bids), 0)
+        self.assertEqual(self.book.submit_order(order('b2', 'buy', 100, 1, 'post_only')), [])
+        self.assertEqual(self.book.bids[0].order_id, 'b2')
+        # Repricing a resting post-only order through the spread is rejected
+        with self.assertRaises(OrderRejected):
+            self.book.amend_order('b2', 1, 101)
+        self.assertEqual(self.book.get_l2_depth()['bids'], [(100, 1)])
+        self.assertIs(self.book.order_map['b2'], self.book.bids[0])
+
+    def test_stop_triggers_on_trade(self):
+        self.book.submit_order(order('stop', 'buy', 102, 2, stop_price=101))
+        self.assertEqual(len(self.book.bids), 0)
+        self.assertIn('stop', self.book.stop_map)
+        # A trade at 101 triggers the buy stop, which lifts the rest of the asks
+        trades = self.book.submit_order(order('b1', 'buy', 101, 1))
+        self.assertEqual([t['buy_order_id'] for t in trades], ['b1', 'stop', 'stop'])
+        self.assertEqual(self.book.stop_map, {})
+        self.assertEqual(self.book.get_l2_depth()['asks'], [(102, 1)])
+
+    def test_stops_cascade_and_cancel(self):
+        self.book.submit_order(order('bid', 'buy', 99, 5))
+        self.book.submit_order(order('st1', 'sell', 90, 1, stop_price=99))
+        self.book.submit_order(order('st2', 'sell', 90, 1, stop_price=98))
+        self.book.submit_order(order('st3', 'sell', 90, 1, stop_price=95))
+        self.book.submit_order(order('bid2', 'buy', 98, 1))
+        self.assertTrue(self.book.cancel_order('st3'))
+        # Trade at 99 fires st1; it trades at 99 too, then stays above st2's 98
+        trades = self.book.submit_order(order('s3', 'sell', 99, 1))
+        self.assertEqual([t['sell_order_id'] for t in trades], ['s3', 'st1'])
+        self.assertEqual(list(self.book.stop_map), ['st2'])
+        # Sweeping down to 98 fires st2, which finds no bids left and rests at 90
+        trades = self.book.submit_order(order('s4', 'sell', 98, 4))
+        self.assertEqual([(t['sell_order_id'], t['price']) for t in trades], [('s4', 99), ('s4', 98)])
+        self.assertEqual(self.book.stop_map, {})
+        self.assertEqual(len(self.book.bids), 0)
+        self.assertEqual(self.book.get_l2_depth()['asks'][0], (90, 1))
+
+    def test_stop_already_through_fires_immediately(self):
+        self.book.submit_order(order('b1', 'buy', 101, 1))
+        trades = self.book.submit_order(order('stop', 'buy', 101, 1, stop_price=100))
+        self.assertEqual(len(trades), 1)
+        self.assertEqual(self.book.stop_map, {})
+
+class TestSelfTradePrevention(unittest.TestCase):
+    def setUp(self):
+        self.book = OrderBook(symbol='BTCUSD')
+        for order_id, user, price in (('a1', 'alice', 100), ('b1', 'bob', 100), ('a2', 'alice', 101)):
+            self.book.submit_order(Order(order_id=order_id, symbol='BTCUSD', side='sell', price=price,
+                                         quantity=2, user_id=user))
+
+    def buy(self, quantity, stp_mode, order_type='limit'):
+        return self.book.submit_order(Order(order_id='in', symbol='BTCUSD', side='buy', price=101, quantity=quantity,
+                                            user_id='alice', order_type=order_type, stp_mode=stp_mode))
+
+    def test_cancel_newest(self):
+        self.assertEqual(self.buy(5, 'cancel_newest'), [])
+        self.assertNotIn('in', self.book.order_map)
+        self.assertEqual(self.book.get_l2_depth()['asks'], [(100, 4), (101, 2)])
+
+    def test_cancel_oldest(self):
+        trades = self.buy(5, 'cancel_oldest')
+        self.assertEqual([(t['sell_order_id'], t['quantity']) for t in trades], [('b1', 2)])
+        self.assertEqual(self.book.get_l2_depth(), {'bids': [(101, 3)], 'asks': []})
+
+    def test_decrement_both(self):
+        trades = self.buy(3, 'decrement_both')
+        self.assertEqual([(t['sell_order_id'], t['quantity']) for t in trades], [('b1', 1)])
+        self.assertNotIn('a1', self.book.order_map)
+        self.assertEqual(self.book.get_l2_depth()['asks'], [(100, 1), (101, 2)])
+
+    def test_fok_ignores_own_liquidity(self):
+        self.assertEqual(self.buy(4, 'cancel_oldest', 'fok'), [])
+        self.assertEqual(len(self.buy(2, 'cancel_oldest', 'fok')), 1)
+
+    def test_without_stp_same_user_trades(self):
+        self.assertEqual(self.buy(1, None)[0]['sell_order_id'], 'a1')
+
+    def test_crossed_book_uses_newest_mode(self):
+        self.book.add_order(Order(order_id='in', symbol='BTCUSD', side='buy', price=100, quantity=1,
+                                  user_id='alice', stp_mode='cancel_newest'))
+        self.assertEqual(self.book.match_orders(), [])
+        self.assertEqual(len(self.book.bids), 0)
+
+class TestOrderTypesAPI(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        order_books.clear()
+        risk_engine.reset()
+
+    def test_order_type_states(self):
+        post = lambda **kw: self.client.post('/order', json=dict(symbol='BTCUSD', quantity=1, **kw)).get_json()
+        self.assertEqual(post(order_id='1', side='sell', price=100)['state'], 'resting')
+        self.assertEqual(post(order_id='2', side='buy', price=100, order_type='post_only')['status'], 'rejected')
+        self.assertEqual(post(order_id='3', side='buy', price=99, order_type='ioc')['state'], 'cancelled')
+        self.assertEqual(post(order_id='4', side='buy', price=101, stop_price=101)['state'], 'pending')
+        self.assertEqual(post(order_id='5', side='buy', price=100, order_type='fok')['state'], 'filled')
+        self.assertEqual(post(order_id='6', side='buy', price=100, order_type='market')['status'], 'rejected')
+        self.assertEqual(post(order_id='7', side='buy', price=100, stp='cancel_both')['status'], 'rejected')
+        post(order_id='8', side='sell', price=101, order_type='post_only')
+        post(order_id='9', side='buy', price=99)
+        resp = self.client.post('/order/modify', json={'symbol': 'BTCUSD', 'order_id': '8', 'quantity': 1, 'price': 99})
+        self.assertEqual(resp.get_json()['status'], 'rejected')
+        resp = self.client.post('/orders/batch', json={'operations': [
+            {'op': 'modify', 'symbol': 'BTCUSD', 'order_id': '8', 'quantity': 1, 'price': 99}]})
+        self.assertEqual(resp.get_json()['results'][0]['status'], 'rejected')
+        self.assertIn('8', order_books['BTCUSD'].order_map)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,11 +20,53 @@ class TestPnLIntegration(unittest.TestCase):
         # Check PnL
         pnlA = self.book.pnl_tracker.get_pnl('userA')
         pnlB = self.book.pnl_tracker.get_pnl('userB')
-        # userA bought 2 at 100, userB sold 2 at 100
+        # userA bought 2 at 100, userB sold 2 at 100: open positions, nothing realized
         self.assertEqual(pnlA['positions']['BTCUSD'], 2)
         self.assertEqual(pnlB['positions']['BTCUSD'], -2)
-        self.assertEqual(pnlA['realized'], -200)
-        self.assertEqual(pnlB['realized'], 200)
+        self.assertEqual(pnlA['realized'], 0)
+        self.assertEqual(pnlB['realized'], 0)
+        self.assertEqual(pnlA['avg_prices']['BTCUSD'], 100)
+        self.assertEqual(pnlA['unrealized'], 0)
+
+class TestPnLTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = PnLTracker()
+
+    def test_average_cost_and_realized(self):
+        self.tracker.update_trade('A', 'B', 'BTCUSD', 100, 2)
+        self.tracker.update_trade('A', 'B', 'BTCUSD', 110, 2)
+        pnlA = self.tracker.get_pnl('A')
+        self.assertEqual(pnlA['avg_prices']['BTCUSD'], 105)
+        self.assertEqual(pnlA['unrealized'], 20)  # (110 - 105) * 4 at the last trade
+        # A sells 3 at 120: realizes (120 - 105) * 3, keeps 1 at 105
+        self.tracker.update_trade('C', 'A', 'BTCUSD', 120, 3)
+        pnlA = self.tracker.get_pnl('A')
+        self.assertEqual(pnlA['realized'], 45)
+        self.assertEqual(pnlA['positions']['BTCUSD'], 1)
+        self.assertEqual(pnlA['avg_prices']['BTCUSD'], 105)
+        self.assertEqual(pnlA['unrealized'], 15)
+        # B was short 4 at 105 and is marked at 120
+        self.assertEqual(self.tracker.get_pnl('B')['unrealized'], -60)
+
+    def test_flip_and_close(self):
+        self.tracker.update_trade('A', 'B', 'ETHUSD', 10, 1)
+        self.tracker.update_trade('B', 'A', 'ETHUSD', 12, 3)
+        pnlA = self.tracker.get_pnl('A')
+        self.assertEqual(pnlA['realized'], 2)
+        self.assertEqual(pnlA['positions']['ETHUSD'], -2)
+        self.assertEqual(pnlA['avg_prices']['ETHUSD'], 12)
+        self.assertEqual(self.tracker.get_pnl('A', marks={'ETHUSD': 11})['unrealized'], 2)
+        self.tracker.update_trade('A', 'B', 'ETHUSD', 0.3, 0.1)
+        self.tracker.update_trade('A', 'B', 'ETHUSD', 0.3, 1.9)
+        self.assertEqual(self.tracker.get_pnl('A')['positions']['ETHUSD'], 0)
+        self.assertEqual(self.tracker.get_pnl('A')['unrealized'], 0)
+
+    def test_zero_quantity_fill_is_ignored(self):
+        self.tracker.update_trade('A', 'B', 'BTCUSD', 100, 0)
+        self.assertEqual(self.tracker.get_pnl('A')['positions'], {})
+        self.tracker.update_trade('A', 'B', 'BTCUSD', 100, 1)
+        self.tracker.update_trade('A', 'B', 'BTCUSD', 120, 0)
+        self.assertEqual(self.tracker.get_pnl('A')['avg_prices']['BTCUSD'], 100)
 
 if __name__ == '__main__':
     unittest.main()
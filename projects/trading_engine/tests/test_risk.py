@@ -0,0 +1,107 @@
+import unittest
+from app.order_book import Order, OrderBook, SymbolSpec
+from app.risk import RiskEngine, MaxOrderSize, PriceBand, PositionLimit, MessageRate
+from app.routes import app, order_books, risk_engine
+
+def order(order_id, side, price, quantity, user_id='u1'):
+    return Order(order_id=order_id, symbol='BTCUSD', side=side, price=price, quantity=quantity, user_id=user_id)
+
+class TestRiskChecks(unittest.TestCase):
+    def setUp(self):
+        self.book = OrderBook('BTCUSD', SymbolSpec(tick_size=1, lot_size=0.5))
+
+    def test_max_order_size(self):
+        check = MaxOrderSize(max_quantity=5)
+        self.assertIsNone(check.check(self.book, order('1', 'buy', 100, 10)))
+        self.assertIn('quantity', check.check(self.book, order('2', 'buy', 100, 11)))
+
+    def test_price_band(self):
+        check = PriceBand(fraction=0.1)
+        # No trade yet: any price is accepted
+        self.assertIsNone(check.check(self.book, order('1', 'buy', 1, 1)))
+        self.book.submit_order(order('s', 'sell', 100, 1, 'a'))
+        self.book.submit_order(order('b', 'buy', 100, 1, 'b'))
+        self.assertIsNone(check.check(self.book, order('2', 'buy', 110, 1)))
+        self.assertIn('band', check.check(self.book, order('3', 'sell', 89, 1)))
+
+    def test_position_limit(self):
+        check = PositionLimit(max_position=3)
+        self.book.submit_order(order('s', 'sell', 100, 4, 'a'))
+        self.book.submit_order(order('b', 'buy', 100, 4, 'b'))  # b is long 2.0
+        self.assertIsNone(check.check(self.book, order('1', 'buy', 100, 2, 'b')))
+        self.assertIsNotNone(check.check(self.book, order('2', 'buy', 100, 3, 'b')))
+        self.assertIsNone(check.check(self.book, order('3', 'sell', 100, 10, 'b')))
+        self.assertIsNotNone(check.check(self.book, order('4', 'sell', 100, 11, 'b')))
+
+    def test_message_rate(self):
+        check = MessageRate(max_messages=3, per_seconds=60)
+        results = [check.check(self.book, order(str(i), 'buy', 100, 1)) for i in range(4)]
+        self.assertEqual(results[:3], [None, None, None])
+        self.assertIn('rate', results[3])
+        self.assertIsNone(check.check(self.book, order('x', 'buy', 100, 1, 'u2')))
+        # Orders without a user are not rate limited
+        self.assertIsNone(check.check(self.book, order('y', 'buy', 100, 1, None)))
+        check.reset()
+        self.assertIsNone(check.check(self.book, order('z', 'buy', 100, 1)))
+
+    def test_engine_first_reject_wins(self):
+        engine = RiskEngine([MaxOrderSize(1), PositionLimit(0)])
+        self.assertIn('quantity', engine.check(self.book, order('1', 'buy', 100, 4)))
+        self.assertIn('position', engine.check(self.book, order('2', 'buy', 100, 2)))
+        self.assertIsNone(RiskEngine().check(self.book, order('3', 'buy', 100, 2)))
+
+    def test_amend_checks_the_change(self):
+        engine = RiskEngine([MaxOrderSize(5), PriceBand(0.1)])
+        self.book.submit_order(order('s', 'sell', 100, 1, 'a'))
+        self.book.submit_order(order('b', 'buy', 100, 1, 'b'))
+        self.book.submit_order(order('1', 'buy', 95, 8))
+        # Only the added quantity counts against the size limit
+        self.assertIsNone(engine.check_amend(self.book, '1', 18))
+        self.assertIn('quantity', engine.check_amend(self.book, '1', 19))
+        self.assertIn('band', engine.check_amend(self.book, '1', 8, 120))
+        # Reductions in place and unknown ids are left to amend_order
+        self.assertIsNone(RiskEngine([MaxOrderSize(0)]).check_amend(self.book, '1', 4))
+        self.assertIsNone(engine.check_amend(self.book, 'missing', 100, 1000))
+
+class TestRiskAPI(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        order_books.clear()
+        risk_engine.reset()
+
+    def test_rejected_order_does_not_reach_book(self):
+        resp = self.client.post('/order', json={
+            'order_id': '1', 'symbol': 'BTCUSD', 'side': 'buy', 'price': 100, 'quantity': 5000000, 'user_id': 'r1'
+        })
+        data = resp.get_json()
+        self.assertEqual(data['status'], 'rejected')
+        self.assertIn('quantity', data['reason'])
+        self.assertEqual(order_books['BTCUSD'].order_map, {})
+        resp = self.client.post('/orders/batch', json={'operations': [
+            {'op': 'add', 'order_id': '2', 'symbol': 'BTCUSD', 'side': 'buy', 'price': 100, 'quantity': 5000000}
+        ]})
+        self.assertEqual(resp.get_json()['results'][0]['status'], 'rejected')
+
+    def test_amend_passes_risk_stage(self):
+        for order_id, side in (('s', 'sell'), ('b', 'buy')):
+            self.client.post('/order', json={
+                'order_id': order_id, 'symbol': 'ETHUSD', 'side': side, 'price': 100, 'quantity': 1
+            })
+        self.client.post('/order', json={
+            'order_id': '1', 'symbol': 'ETHUSD', 'side': 'sell', 'price': 110, 'quantity': 1, 'user_id': 'r1'
+        })
+        resp = self.client.post('/order/modify', json={
+            'order_id': '1', 'symbol': 'ETHUSD', 'quantity': 5000000, 'price': 1000
+        })
+        self.assertEqual(resp.get_json()['status'], 'rejected')
+        resp = self.client.post('/orders/batch', json={'operations': [
+            {'op': 'modify', 'order_id': '1', 'symbol': 'ETHUSD', 'quantity': 1, 'price': 1000}
+        ]})
+        self.assertIn('band', resp.get_json()['results'][0]['reason'])
+        resting = order_books['ETHUSD'].order_map['1']
+        self.assertEqual((resting.price, resting.quantity), (11000, 1000))
+        resp = self.client.post('/order/modify', json={'order_id': '1', 'symbol': 'ETHUSD', 'quantity': 2})
+        self.assertEqual(resp.get_json()['status'], 'ok')
+
+if __name__ == '__main__':
+    unittest.main()
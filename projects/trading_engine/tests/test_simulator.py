@@ -0,0 +1,29 @@
+import unittest
+from app.simulator import run, shard_of
+
+def flow():
+    events = []
+    for i in range(40):
+        symbol = f'S{i % 7}'
+        side = 'buy' if i % 2 else 'sell'
+        events.append(('add', symbol, f'o{i}', side, 100 + (i % 5) - (2 if side == 'sell' else 0), 1 + i % 3, f'u{i % 4}', 'limit'))
+        if i % 6 == 5:
+            events.append(('cancel', symbol, f'o{i - 2}'))
+        if i % 8 == 3:
+            events.append(('modify', symbol, f'o{i}', 5, 103))
+    return events
+
+class TestSimulator(unittest.TestCase):
+    def test_sharded_run_matches_single_process(self):
+        events = flow()
+        expected = run(events, workers=0)
+        self.assertTrue(expected)
+        self.assertEqual([t[0] for t in expected], sorted(t[0] for t in expected))
+        self.assertEqual(run(events, workers=3, batch_size=4), expected)
+
+    def test_shard_of_is_stable(self):
+        self.assertEqual(shard_of('BTCUSD', 8), shard_of('BTCUSD', 8))
+        self.assertEqual({shard_of(f'S{i}', 4) for i in range(100)}, {0, 1, 2, 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+from app.order_book import Order, OrderBook
+from app.tape import TradeTape
+from app.routes import app, order_books, risk_engine
+
+class TestTradeTape(unittest.TestCase):
+    def setUp(self):
+        self.book = OrderBook(symbol='BTCUSD')
+        self.now = 1000.0
+        self.directory = tempfile.TemporaryDirectory()
+        self.tape = TradeTape(self.book, self.directory.name, max_memory=3, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def trade(self, price, quantity, at):
+        self.now = at
+        self.book.submit_order(Order(order_id=f's{at}', symbol='BTCUSD', side='sell', price=price, quantity=quantity))
+        self.book.submit_order(Order(order_id=f'b{at}', symbol='BTCUSD', side='buy', price=price, quantity=quantity))
+
+    def test_query_spans_spilled_and_memory(self):
+        for i, price in enumerate([100, 103, 99, 101, 102]):
+            self.trade(price, 1, 1000.0 + i * 0.5)
+        self.assertEqual(self.tape.spilled, 3)
+        self.assertEqual(len(self.tape), 5)
+        self.assertEqual(self.tape.query(1000.5, 1002.0), [(1000.5, 103, 1), (1001.0, 99, 1), (1001.5, 101, 1)])
+        self.assertEqual(self.tape.query(limit=2), [(1000.0, 100, 1), (1000.5, 103, 1)])
+        self.assertEqual(len(self.tape.query(1001.0)), 3)
+        self.assertEqual(self.tape.query(limit=-1), [])
+
+    def test_bars(self):
+        self.trade(100, 2, 1000.2)
+        self.trade(103, 1, 1000.7)
+        self.trade(99, 1, 1000.9)
+        self.trade(101, 4, 1061.0)
+        self.assertEqual(self.tape.get_bars('1s'), [(1000, 100, 103, 99, 99, 4), (1061, 101, 101, 101, 101, 4)])
+        self.assertEqual(self.tape.get_bars('1m'), [(960, 100, 103, 99, 99, 4), (1020, 101, 101, 101, 101, 4)])
+        self.assertEqual(self.tape.get_bars('1h', 1000), [])
+        self.assertEqual(self.tape.get_bars('1h')[0][1:], (100, 103, 99, 101, 8))
+
+    def test_clock_never_runs_backwards(self):
+        self.trade(100, 1, 1005.0)
+        self.trade(101, 1, 1004.0)
+        self.assertEqual([t[0] for t in self.tape.query()], [1005.0, 1005.0])
+
+class TestTradeTapeAPI(unittest.TestCase):
+    def setUp(self):
+        order_books.pop('TAPE', None)
+        risk_engine.reset()
+        self.client = app.test_client()
+
+    def test_trades_and_bars(self):
+        self.client.post('/order', json={'symbol': 'TAPE', 'order_id': 's1', 'side': 'sell', 'price': 10.5, 'quantity': 2})
+        self.client.post('/order', json={'symbol': 'TAPE', 'order_id': 'b1', 'side': 'buy', 'price': 10.5, 'quantity': 1.5})
+        trades = self.client.get('/trades?symbol=TAPE').get_json()['trades']
+        self.assertEqual([(t['price'], t['quantity']) for t in trades], [(10.5, 1.5)])
+        self.assertEqual(self.client.get(f"/trades?symbol=TAPE&start={trades[0]['timestamp'] + 1}").get_json()['trades'], [])
+        bars = self.client.get('/bars?symbol=TAPE&interval=1s').get_json()['bars']
+        self.assertEqual([(b['open'], b['close'], b['volume']) for b in bars], [(10.5, 10.5, 1.5)])
+        self.assertEqual(self.client.get('/bars?symbol=TAPE&interval=5m').status_code, 400)
+        for query in ('limit=x', 'start=abc', 'end=nan', 'limit=1.5'):
+            self.assertEqual(self.client.get(f'/trades?symbol=TAPE&{query}').status_code, 400)
+        self.assertEqual(self.client.get('/bars?symbol=TAPE&start=x').status_code, 400)
+        self.assertEqual(self.client.get('/trades?symbol=TAPE&limit=-1').get_json()['trades'], [])
+
+if __name__ == '__main__':
+    unittest.main()